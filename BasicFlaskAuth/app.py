@@ -4,6 +4,8 @@ from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
 
+from token_cache import TokenCache
+
 
 app = Flask(__name__)
 
@@ -11,6 +13,9 @@ AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
 ALGORITHMS = ['RS256']
 API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
 
+# payloads of the tokens verified recently, see token_cache.stats() for its hit rate
+token_cache = TokenCache()
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -52,6 +57,10 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
     jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
@@ -80,6 +89,7 @@ def verify_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
+            token_cache.set(token, payload)
 
             return payload
 
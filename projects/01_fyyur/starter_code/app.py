@@ -7,15 +7,24 @@ import datetime
 import sys
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import babel.dates
+import click
+from functools import wraps, lru_cache
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context, make_response, session
 from models import db
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import joinedload, selectinload
 from flask_moment import Moment
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from search import get_search_backend
+from lookups import resolve_city, resolve_genres, set_genres
+from bulk import data_formats, read_records, write_records, import_records, export_records
+from cache import page_cache
+from counters import roll_forward, recount
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -24,6 +33,7 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
+page_cache.configure(app.config)
 migrate = Migrate(app, db)
 
 from models import *
@@ -33,13 +43,37 @@ from models import *
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+datetime_formats = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+  # Babel patterns are parsed once per format and locale
+  # besides the formats above, format is one of Babel's named formats ('short', 'long', ...),
+  # resolved to the pattern of the locale as babel.dates.format_datetime does, or a pattern
+  locale = babel.Locale.parse(locale)
+  if format in datetime_formats:
+    pattern = datetime_formats[format]
+  elif format in locale.datetime_formats:
+    pattern = babel.dates.get_datetime_format(format, locale) \
+      .replace('{0}', babel.dates.get_time_format(format, locale).pattern) \
+      .replace('{1}', babel.dates.get_date_format(format, locale).pattern)
+  else:
+    pattern = format
+  return babel.dates.parse_pattern(pattern), locale
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=None):
+  # takes datetimes as they come from the database, strings are still accepted and parsed
+  # the same show times are formatted again and again, so the results are memoized
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=babel.dates.UTC)
+  pattern, locale = datetime_pattern(format, locale or babel.dates.LC_TIME)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -70,32 +104,15 @@ def populate_object(form, input_object, operation):
         objectName = 'artist'
         input_object.seeking_venue=form.seeking_venue.data
 
-      object_city = City.query.filter_by(city=form.city.data, state=form.state.data).first()
-
-      if object_city is None:
-        new_city = City(city=form.city.data, state=form.state.data)
-        db.session.add(new_city)
-        db.session.commit()
-        input_object.city = new_city.id
-      else:
-        input_object.city = object_city.id
-
-      object_genres_input = form.genres.data
-      genre_list = []
-
-      for genre_input in object_genres_input:
-        db_value = Genre.query.filter_by(name=genre_input).first()
-        if db_value is None:
-          new_genre = Genre(name=genre_input)
-          db.session.add(new_genre)
-          db.session.commit()
-          genre_list.append(new_genre)
-        else:
-          genre_list.append(db_value)
+      # cities and genres are resolved through the lookup cache and created in bulk if missing,
+      # everything is then written in a single commit
+      input_object.city = resolve_city(db.session, form.city.data, form.state.data)
+      genre_ids = resolve_genres(db.session, form.genres.data)
 
-      input_object.genres = genre_list
       db.session.add(input_object)
+      set_genres(db.session, input_object, genre_ids)
       db.session.commit()
+      page_cache.invalidate(objectName+'s', 'shows')
     else:
       error=True
   except:
@@ -117,6 +134,180 @@ def populate_object(form, input_object, operation):
   else:
     flash('Yey ' + objectName + ' ' + request.form['name'] + ' was successfully '+operation+'!')
 
+def group_venues_by_city():
+  # a single query returns one row per venue, already ordered by city,
+  # together with its maintained number of upcoming shows (see counters.py)
+  # the rows are then folded into areas in one linear pass
+  rows = db.session.query(City.id, City.city, City.state, Venue.id, Venue.name, Venue.upcoming_shows_count) \
+    .join(Venue, Venue.city == City.id) \
+    .order_by(City.state, City.city, City.id, Venue.name) \
+    .all()
+
+  areas = []
+  current_city_id = None
+
+  for city_id, city, state, venue_id, venue_name, num_upcoming_shows in rows:
+    if(city_id != current_city_id):
+      current_city_id = city_id
+      areas.append({
+        "city": city,
+        "state": state,
+        "venues": []
+        })
+    areas[-1]["venues"].append({
+      "id": venue_id,
+      "name": venue_name,
+      "num_upcoming_shows": num_upcoming_shows
+      })
+
+  return areas
+
+def load_show_detail(entity_model, entity_id):
+  # builds the data used by the venue and artist detail pages
+  # the entity is loaded with its city joined in and its genres selectin-loaded,
+  # and its shows are fetched as plain columns joined to the other side of the show
+  # together with a flag computed by the database telling whether the show is upcoming
+  if(entity_model is Venue):
+    city_relationship = Venue.venue_city
+    entity_key = Show.venue_id
+    other_model = Artist
+    other_key = Show.artist_id
+    other_name = 'artist'
+  else:
+    city_relationship = Artist.artist_city
+    entity_key = Show.artist_id
+    other_model = Venue
+    other_key = Show.venue_id
+    other_name = 'venue'
+
+  entity = entity_model.query \
+    .options(joinedload(city_relationship), selectinload(entity_model.genres)) \
+    .filter(entity_model.id == entity_id) \
+    .first()
+
+  if entity is None:
+    return None
+
+  is_upcoming = (Show.start_time > datetime.now()).label('is_upcoming')
+  shows = db.session.query(is_upcoming, Show.start_time, other_model.id, other_model.name, other_model.image_link) \
+    .join(other_model, other_key == other_model.id) \
+    .filter(entity_key == entity_id) \
+    .order_by(Show.start_time) \
+    .all()
+
+  data = {column.name: getattr(entity, column.name) for column in entity_model.__table__.columns}
+  city = getattr(entity, city_relationship.key)
+  data["city"] = city.city if city is not None else None
+  data["state"] = city.state if city is not None else None
+  data["genres"] = [genre.name for genre in entity.genres]
+  data["past_shows"] = []
+  data["upcoming_shows"] = []
+
+  for show_upcoming, start_time, other_id, other_show_name, other_image_link in shows:
+    entry = {}
+    entry[other_name+"_id"] = other_id
+    entry[other_name+"_name"] = other_show_name
+    entry[other_name+"_image_link"] = other_image_link
+    entry["start_time"] = start_time
+    if(show_upcoming):
+      data["upcoming_shows"].append(entry)
+    else:
+      data["past_shows"].append(entry)
+
+  data["past_shows_count"] = len(data["past_shows"])
+  data["upcoming_shows_count"] = len(data["upcoming_shows"])
+
+  return data
+
+def search_by_name(entity_model, search_term, page=1, limit=None):
+  # returns one page of entities whose name contains search_term, best matches first,
+  # along with the total number of matches
+  # matching and ranking are done by the configured search backend (see search.py)
+  # upcoming shows are read from the maintained counter of each entity (see counters.py)
+  per_page = app.config.get('SEARCH_RESULTS_PER_PAGE', 10)
+  if limit is not None:
+    per_page = min(max(limit, 1), app.config.get('SEARCH_RESULTS_MAX_LIMIT', 100))
+  page = max(page, 1)
+
+  search_backend = get_search_backend(db.engine, app.config.get('SEARCH_BACKEND'))
+  total_query, rank = search_backend.search(db.session.query(func.count(entity_model.id)), entity_model, 'name', search_term)
+  total = total_query.scalar()
+  rows_query, rank = search_backend.search(
+    db.session.query(entity_model.id, entity_model.name, entity_model.upcoming_shows_count),
+    entity_model, 'name', search_term)
+  rows = rows_query \
+    .order_by(rank.desc(), entity_model.name) \
+    .limit(per_page) \
+    .offset((page - 1)*per_page) \
+    .all()
+
+  results = {}
+  results["data"] = [{"id": entity_id, "name": name, "num_upcoming_shows": num_upcoming_shows} for entity_id, name, num_upcoming_shows in rows]
+  results["count"] = total
+  results["page"] = page
+  results["limit"] = per_page
+  results["has_prev"] = page > 1
+  results["has_next"] = page*per_page < total
+
+  return results
+
+def parse_show_cursor(cursor):
+  # a show cursor is "<start_time in ISO format>,<id>", invalid cursors start from the beginning
+  if not cursor:
+    return None
+  try:
+    start_time, show_id = cursor.rsplit(',', 1)
+    return (datetime.fromisoformat(start_time), int(show_id))
+  except ValueError:
+    return None
+
+def stream_template(template_name, **context):
+  # renders a template lazily, sending the output in small chunks as it is produced
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(5)
+  return stream
+
+def cached_page(namespace):
+  # serves a page from the page cache (see cache.py), keyed by its path and query string
+  # the write handlers invalidate the namespaces whose pages they change
+  # while flashed messages are pending the cache is bypassed, since the layout renders them
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      cache_key = page_cache.key(namespace, request.full_path)
+      if cache_key is None or '_flashes' in session:
+        return view(*args, **kwargs)
+
+      body = page_cache.get(cache_key)
+      if body is not None:
+        return Response(body, mimetype='text/html')
+
+      response = make_response(view(*args, **kwargs))
+      if(response.status_code == 200):
+        if response.is_streamed:
+          response.response = cache_stream(cache_key, response.response, response.charset)
+        else:
+          page_cache.set(cache_key, response.get_data())
+      return response
+    return wrapper
+  return decorator
+
+def cache_stream(cache_key, chunks, charset):
+  # passes the chunks of a streamed page through as they are produced, and caches the page
+  # once it has been sent whole, pages of clients that go away before the end are not cached
+  body = []
+  try:
+    for chunk in chunks:
+      if isinstance(chunk, str):
+        chunk = chunk.encode(charset)
+      body.append(chunk)
+      yield chunk
+    page_cache.set(cache_key, b''.join(body))
+  finally:
+    if hasattr(chunks, 'close'):
+      chunks.close()
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -130,82 +321,27 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cached_page('venues')
 def venues():
-  cities = City.query.order_by(City.state)
-  venues = db.session.query(Venue, func.count(Show.id)).join(Show, isouter=True).group_by(Venue.id).order_by(Venue.name)
-  real_data = []
-
-  
-  for city in cities:
-    entry = {}
-    entry["city"] = city.city
-    entry["state"] = city.state
-    entry["venues"] = []
-    for venue in venues:
-      if(city.id == venue[0].city):
-        venue_entry = {}
-        venue_entry["id"] = venue[0].id
-        venue_entry["name"] = venue[0].name
-        venue_entry["num_upcoming_shows"] = venue[1]
-        entry["venues"].append(venue_entry)
-    if(len(entry["venues"]) > 0):
-      real_data.append(entry)
-
+  return render_template('pages/venues.html', areas=group_venues_by_city())
 
-  return render_template('pages/venues.html', areas=real_data);
 
-
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
+  # search term, page and limit are accepted both from the search form and from the query string
+  # so that the pagination links on the results page can be followed
+  search_term = request.values.get('search_term', '')
+  results = search_by_name(Venue, search_term, request.values.get('page', 1, type=int), request.values.get('limit', None, type=int))
 
-  search_query = '%'+request.form.get('search_term', '')+'%'
-  search_venues = Venue.query.filter(Venue.name.ilike(search_query))
-  real_data = {}
-  real_data["data"] = []
-
-  for search_venue in search_venues:
-    entry = {}
-    entry["id"] = search_venue.id
-    entry["name"] = search_venue.name
-    entry["num_upcoming_shows"] = len(search_venue.show)
-    real_data["data"].append(entry)
-
-  real_data["count"] = len(real_data["data"])
-
-  return render_template('pages/search_venues.html', results=real_data, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=results, search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-  genres = Genre.query.join(venue_genre).filter((venue_genre.c.genre_id == Genre.id) & (venue_genre.c.venue_id == venue_id)).all()
-  shows = db.session.query(Show, Artist).filter((Show.venue_id == venue_id) & (Show.artist_id == Artist.id)).all()
-  venue = db.session.query(Venue, City).join(City).filter(Venue.id == venue_id).first()
-
-  # initialize data dictionary with values retrieved from the Venue table
-  # since venue represents a tuple of type (Venue, City), we're grabbing only the venue portion for initialization
-  data = vars(venue[0])
-  data["state"] = venue[1].state
-  data["city"] = venue[1].city
-  data["genres"] = []
-  data["past_shows"] = []
-  data["upcoming_shows"] =[]
-
-  for genre in genres:
-    data["genres"].append(genre.name)
+  data = load_show_detail(Venue, venue_id)
 
-  for show in shows:
-    entry = {}
-    entry["artist_id"] = show[0].artist_id
-    entry["artist_name"] = show[1].name
-    entry["artist_image_link"] = show[1].image_link
-    entry["start_time"] = str(show[0].start_time)
-    if(show[0].start_time < datetime.now()):
-      data["past_shows"].append(entry)
-    else:
-      data["upcoming_shows"].append(entry)
-
-  data["past_shows_count"] = len(data["past_shows"])
-  data["upcoming_shows_count"] = len(data["upcoming_shows"])
+  if data is None:
+    abort(404)
 
   return render_template('pages/show_venue.html', venue=data)
 
@@ -237,6 +373,7 @@ def delete_venue(venue_id):
     to_delete = db.session.query(Venue).filter(Venue.id==venue_id).first()
     db.session.delete(to_delete)
     db.session.commit()
+    page_cache.invalidate('venues', 'shows')
   except:
     db.session.rollback()
     error = True
@@ -254,64 +391,28 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cached_page('artists')
 def artists():
   
   return render_template('pages/artists.html', artists=Artist.query.order_by(Artist.name))
 
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
+  # search term, page and limit are accepted both from the search form and from the query string
+  # so that the pagination links on the results page can be followed
+  search_term = request.values.get('search_term', '')
+  results = search_by_name(Artist, search_term, request.values.get('page', 1, type=int), request.values.get('limit', None, type=int))
 
-  search_query = '%'+request.form.get('search_term', '')+'%'
-  search_artists = Artist.query.filter(Artist.name.ilike(search_query))
-  real_data = {}
-  real_data["data"] = []
-
-  for search_artist in search_artists:
-    entry = {}
-    entry["id"] = search_artist.id
-    entry["name"] = search_artist.name
-    entry["num_upcoming_shows"] = len(search_artist.show)
-    real_data["data"].append(entry)
-
-  real_data["count"] = len(real_data["data"])
-
-  
-  return render_template('pages/search_artists.html', results=real_data, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=results, search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
+  data = load_show_detail(Artist, artist_id)
 
-  artist = db.session.query(Artist, City).join(City).filter(Artist.id == artist_id).first()
-  genres = Genre.query.join(artist_genre).filter((artist_genre.c.genre_id == Genre.id) & (artist_genre.c.artist_id == artist_id)).all()
-  shows = db.session.query(Show, Venue).filter((Show.artist_id == artist_id) & (Show.venue_id == Venue.id)).all()
-
-  # initialize data dictionary with values retrieved from the Artist table
-  # since artist represents a tuple of type (Artist, City), we're grabbing only the artist portion for initialization
-  data = vars(artist[0])
-  data["state"] = artist[1].state
-  data["city"] = artist[1].city
-  data["genres"] = []
-  data["past_shows"] = []
-  data["upcoming_shows"] =[]
-
-  for genre in genres:
-    data["genres"].append(genre.name)
-
-  for show in shows:
-    entry = {}
-    entry["venue_id"] = show[0].venue_id
-    entry["venue_name"] = show[1].name
-    entry["venue_image_link"] = show[1].image_link
-    entry["start_time"] = str(show[0].start_time)
-    if(show[0].start_time < datetime.now()):
-      data["past_shows"].append(entry)
-    else:
-      data["upcoming_shows"].append(entry)
-
-  data["past_shows_count"] = len(data["past_shows"])
-  data["upcoming_shows_count"] = len(data["upcoming_shows"])
+  if data is None:
+    abort(404)
 
   return render_template('pages/show_artist.html', artist=data)
 
@@ -409,21 +510,42 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@cached_page('shows')
 def shows():
-  real_data = []
-  db_shows = db.session.query(Venue, Show, Artist).filter((Show.venue_id == Venue.id) & (Show.artist_id == Artist.id)).order_by(Show.start_time)
-
-  for show in db_shows:
-    entry = {}
-    entry["venue_id"] = show[0].id
-    entry["artist_id"] = show[2].id
-    entry["venue_name"] = show[0].name
-    entry["artist_name"] = show[2].name
-    entry["artist_image_link"] = show[2].image_link
-    entry["start_time"] = str(show[1].start_time)
-    real_data.append(entry)
-  
-  return render_template('pages/shows.html', shows=real_data)
+  # shows are listed one page at a time, ordered by (start_time, id)
+  # the after parameter is the (start_time, id) cursor of the last show of the previous page,
+  # and upcoming=1 restricts the list to shows that have not started yet
+  per_page = app.config.get('SHOWS_PER_PAGE', 30)
+  upcoming_only = request.args.get('upcoming', 0, type=int) == 1
+  after = parse_show_cursor(request.args.get('after', None))
+
+  db_shows = db.session.query(Show.id, Show.start_time, Venue.id, Venue.name, Artist.id, Artist.name, Artist.image_link) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id)
+  if upcoming_only:
+    db_shows = db_shows.filter(Show.start_time > datetime.now())
+  if after is not None:
+    db_shows = db_shows.filter(tuple_(Show.start_time, Show.id) > after)
+  # one extra row tells whether there is a next page
+  rows = db_shows.order_by(Show.start_time, Show.id).limit(per_page + 1).all()
+
+  next_cursor = None
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    next_cursor = rows[-1][1].isoformat() + ',' + str(rows[-1][0])
+
+  def entries():
+    for show_id, start_time, venue_id, venue_name, artist_id, artist_name, artist_image_link in rows:
+      yield {
+        "venue_id": venue_id,
+        "artist_id": artist_id,
+        "venue_name": venue_name,
+        "artist_name": artist_name,
+        "artist_image_link": artist_image_link,
+        "start_time": start_time
+        }
+
+  return Response(stream_with_context(stream_template('pages/shows.html', shows=entries(), next_cursor=next_cursor, upcoming=upcoming_only)))
 
 @app.route('/shows/create')
 def create_shows():
@@ -447,6 +569,7 @@ def create_show_submission():
         )
       db.session.add(new_show)
       db.session.commit()
+      page_cache.invalidate('shows', 'venues')
     else:
       error=True
 
@@ -468,6 +591,103 @@ def create_show_submission():
 
   return render_template('pages/home.html')
 
+#  Bulk import / export
+#  ----------------------------------------------------------------
+
+# the format of the data is given by the format parameter, or else by the content type of the request
+content_types = {
+  'csv': 'text/csv',
+  'ndjson': 'application/x-ndjson',
+  'json': 'application/json'
+}
+
+# cached pages changed by importing each kind of record
+imported_namespaces = {
+  'venues': ['venues'],
+  'artists': ['artists'],
+  'shows': ['shows', 'venues']
+}
+
+@app.route('/<any(venues, artists, shows):kind>/import', methods=['POST'])
+def import_kind(kind):
+  data_format = request.args.get('format', None)
+  if data_format is None:
+    data_format = next((name for name, content_type in content_types.items() if content_type == request.mimetype), None)
+  if data_format not in data_formats:
+    abort(415)
+
+  # the body is read incrementally from the request stream, one line at a time
+  summary = import_records(kind, read_records(request.stream, data_format))
+  page_cache.invalidate(*imported_namespaces[kind])
+
+  return jsonify({
+    'success': len(summary['errors']) == 0,
+    'imported': summary['imported'],
+    'errors': summary['errors']
+    })
+
+@app.route('/<any(venues, artists, shows):kind>/export')
+def export_kind(kind):
+  data_format = request.args.get('format', 'ndjson')
+  if data_format not in data_formats:
+    abort(415)
+
+  records = write_records(export_records(kind), data_format, kind)
+  return Response(stream_with_context(records), mimetype=content_types[data_format])
+
+@app.cli.command('import-records')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'data_format', type=click.Choice(data_formats), default='csv')
+@click.option('--batch-size', type=int, default=1000)
+def import_records_command(kind, source, data_format, batch_size):
+  """Import venues, artists or shows from a CSV, NDJSON or JSON file.
+
+  Records keep their id when it is not used yet, so an export is imported with
+  its venues and artists first, then its shows.
+  """
+  summary = import_records(kind, read_records(source, data_format), batch_size)
+  # only reaches the running servers when the page cache is shared through Redis,
+  # in-process caches expire the imported pages after PAGE_CACHE_TTL
+  page_cache.invalidate(*imported_namespaces[kind])
+  for error in summary['errors']:
+    click.echo('row {}: {}'.format(error['row'], error['errors']), err=True)
+  click.echo('imported {} {}, {} errors'.format(summary['imported'], kind, len(summary['errors'])))
+
+@app.cli.command('export-records')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('destination', type=click.File('w'), default='-')
+@click.option('--format', 'data_format', type=click.Choice(data_formats), default='csv')
+@click.option('--batch-size', type=int, default=1000)
+def export_records_command(kind, destination, data_format, batch_size):
+  """Export venues, artists or shows to a CSV, NDJSON or JSON file."""
+  for chunk in write_records(export_records(kind, batch_size), data_format, kind):
+    destination.write(chunk)
+
+#  Show counters
+#  ----------------------------------------------------------------
+
+@app.cli.command('roll-forward-shows')
+def roll_forward_shows_command():
+  """Move the shows that have started from the upcoming to the past show counters.
+
+  Meant to be run periodically, e.g. every few minutes from cron: until it runs,
+  the venue list and the search results count started shows as upcoming.
+  """
+  moved = roll_forward(db.session.connection())
+  db.session.commit()
+  if moved:
+    page_cache.invalidate('venues')
+  click.echo('moved {} shows to the past'.format(moved))
+
+@app.cli.command('recount-shows')
+def recount_shows_command():
+  """Recompute the upcoming and past show counters of every venue and artist."""
+  recount(db.session.connection())
+  db.session.commit()
+  page_cache.invalidate('venues')
+  click.echo('recounted the shows of every venue and artist')
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
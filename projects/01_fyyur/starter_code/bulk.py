@@ -0,0 +1,341 @@
+import csv
+import io
+import json
+from datetime import datetime
+import dateutil.parser
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm
+from models import db, Venue, Artist, Show, City, Genre, venue_genre, artist_genre
+from lookups import resolve_cities, resolve_genres
+from counters import update_counters
+
+#----------------------------------------------------------------------------#
+# Record formats.
+#----------------------------------------------------------------------------#
+
+# number of records validated, inserted and committed together
+BATCH_SIZE = 1000
+
+# fields of each kind of record, in the order of the CSV columns
+# in CSV files genres are a single column of ';'-separated names
+record_fields = {
+  'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website', 'seeking_talent', 'seeking_description'],
+  'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website', 'seeking_venue', 'seeking_description'],
+  'shows': ['id', 'artist_id', 'venue_id', 'start_time']
+}
+
+data_formats = ['csv', 'ndjson', 'json']
+
+def read_records(lines, data_format):
+  # yields records one at a time from an iterable of binary lines (an uploaded stream or a file)
+  # csv and ndjson are read incrementally, json is a single array and has to be parsed whole
+  if(data_format == 'csv'):
+    for record in csv.DictReader(line.decode('utf-8') for line in lines):
+      if record.get('genres') is not None:
+        record['genres'] = [genre.strip() for genre in record['genres'].split(';') if genre.strip()]
+      yield record
+  elif(data_format == 'ndjson'):
+    for line in lines:
+      if line.strip():
+        yield json.loads(line)
+  else:
+    for record in json.loads(b''.join(lines)):
+      yield record
+
+def write_records(records, data_format, kind):
+  # yields the serialized records chunk by chunk, so that they can be streamed
+  if(data_format == 'csv'):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=record_fields[kind])
+    writer.writeheader()
+    for record in records:
+      if 'genres' in record:
+        record['genres'] = ';'.join(record['genres'])
+      writer.writerow(record)
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  elif(data_format == 'ndjson'):
+    for record in records:
+      yield json.dumps(record) + '\n'
+  else:
+    separator = '['
+    for record in records:
+      yield separator + json.dumps(record)
+      separator = ','
+    yield '[]' if separator == '[' else ']'
+
+def parse_bool(value):
+  if isinstance(value, str):
+    return value.strip().lower() in ['true', 't', 'yes', 'y', '1', 'on']
+  return bool(value)
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+def import_records(kind, records, batch_size=BATCH_SIZE):
+  # imports venues, artists or shows in batches, each batch being inserted with executemany
+  # and committed on its own
+  # records keep their id if they have one that is not used yet, so that the shows of an export
+  # still reference the right venues and artists once imported, in the order venues, artists, shows
+  # invalid records are skipped and reported with their row number (starting at 1)
+  # returns the number of imported records and the errors
+  summary = {'imported': 0, 'errors': []}
+  batch = []
+
+  for row, record in enumerate(records, 1):
+    batch.append((row, record))
+    if len(batch) >= batch_size:
+      import_batch(kind, batch, summary)
+      batch = []
+  if batch:
+    import_batch(kind, batch, summary)
+
+  return summary
+
+def import_batch(kind, batch, summary):
+  try:
+    if(kind == 'shows'):
+      import_shows(batch, summary)
+    elif(kind == 'venues'):
+      import_entities(Venue, VenueForm, venue_genre, 'venue_id', batch, summary)
+    else:
+      import_entities(Artist, ArtistForm, artist_genre, 'artist_id', batch, summary)
+  except Exception as e:
+    db.session.rollback()
+    for row, record in batch:
+      summary['errors'].append({'row': row, 'errors': {'batch': str(e)}})
+  finally:
+    db.session.close()
+
+def parse_id(value):
+  # ids are optional in imported records, an empty CSV column means no id
+  if value is None or value == '':
+    return None
+  return int(value)
+
+def check_ids(model, valid, errors):
+  # keeps the records whose id is not used, neither by an existing row nor by an earlier record
+  ids = [entity_id for row, entity_id, values in valid if entity_id is not None]
+  existing = set(entity_id for entity_id, in db.session.query(model.id).filter(model.id.in_(ids))) if ids else set()
+  seen = set()
+  unique = []
+  for row, entity_id, values in valid:
+    if entity_id in existing or entity_id in seen:
+      errors.append({'row': row, 'errors': {'id': 'A record with the same id already exists.'}})
+    else:
+      if entity_id is not None:
+        seen.add(entity_id)
+      unique.append((row, entity_id, values))
+  return unique
+
+def insert_rows(model, rows):
+  # rows with and without ids are inserted separately, since executemany needs the same columns in every row
+  with_ids = [values for values in rows if 'id' in values]
+  without_ids = [values for values in rows if 'id' not in values]
+  if with_ids:
+    db.session.execute(model.__table__.insert(), with_ids)
+    reset_id_sequence(model)
+  if without_ids:
+    db.session.execute(model.__table__.insert(), without_ids)
+
+def reset_id_sequence(model):
+  # rows inserted with their own ids do not advance the id sequence on Postgres,
+  # it is moved past the largest id so that the generated ids do not collide with them
+  # (SQLite generates ids after the largest one anyway)
+  if(db.engine.dialect.name == 'postgresql'):
+    db.session.execute("SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT MAX(id) FROM \"{table}\"))".format(table=model.__tablename__))
+
+def import_entities(model, form_class, association, key, batch, summary):
+  seeking_field = 'seeking_talent' if model is Venue else 'seeking_venue'
+  valid = []
+  errors = []
+
+  # records are validated with the same forms as the create pages
+  for row, record in batch:
+    try:
+      entity_id = parse_id(record.get('id'))
+    except (TypeError, ValueError):
+      errors.append({'row': row, 'errors': {'id': 'An integer id is required.'}})
+      continue
+    formdata = MultiDict()
+    for field, value in record.items():
+      if(field == 'id'):
+        continue
+      elif(field == 'genres'):
+        for genre in value or []:
+          formdata.add('genres', genre)
+      elif(field == seeking_field):
+        formdata.add(field, 'y' if parse_bool(value) else '')
+      elif value is not None:
+        formdata.add(field, str(value))
+    form = form_class(formdata)
+    if form.validate():
+      valid.append((row, entity_id, form))
+    else:
+      errors.append({'row': row, 'errors': {field: field_errors[0] for field, field_errors in form.errors.items()}})
+
+  # ids and names are unique, both within the batch and against existing rows
+  valid = check_ids(model, valid, errors)
+  names = [form.name.data for row, entity_id, form in valid]
+  existing = set(name for name, in db.session.query(model.name).filter(model.name.in_(names)))
+  seen = set()
+  unique = []
+  for row, entity_id, form in valid:
+    if form.name.data in existing or form.name.data in seen:
+      errors.append({'row': row, 'errors': {'name': 'A record with the same name already exists.'}})
+    else:
+      seen.add(form.name.data)
+      unique.append((row, entity_id, form))
+
+  if unique:
+    city_ids = resolve_cities(db.session, [(form.city.data, form.state.data) for row, entity_id, form in unique])
+    genre_names = [genre for row, entity_id, form in unique for genre in form.genres.data]
+    genre_ids = dict(zip(list(dict.fromkeys(genre_names)), resolve_genres(db.session, genre_names)))
+
+    rows = []
+    for row, entity_id, form in unique:
+      values = {
+        'name': form.name.data,
+        'city': city_ids[(form.city.data, form.state.data)],
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'website': form.website.data,
+        'seeking_description': form.seeking_description.data,
+        seeking_field: getattr(form, seeking_field).data
+      }
+      if model is Venue:
+        values['address'] = form.address.data
+      if entity_id is not None:
+        values['id'] = entity_id
+      rows.append(values)
+    insert_rows(model, rows)
+
+    # executemany does not return the generated ids, so they are read back by name
+    entity_ids = dict(db.session.query(model.name, model.id).filter(model.name.in_(list(seen))))
+    genre_rows = [{key: entity_ids[form.name.data], 'genre_id': genre_ids[genre]} for row, entity_id, form in unique for genre in dict.fromkeys(form.genres.data)]
+    if genre_rows:
+      db.session.execute(association.insert(), genre_rows)
+    db.session.commit()
+
+  summary['imported'] += len(unique)
+  summary['errors'].extend(sorted(errors, key=lambda error: error['row']))
+
+def import_shows(batch, summary):
+  valid = []
+  errors = []
+
+  for row, record in batch:
+    record_errors = {}
+    values = {}
+    try:
+      show_id = parse_id(record.get('id'))
+    except (TypeError, ValueError):
+      record_errors['id'] = 'An integer id is required.'
+    for field in ['artist_id', 'venue_id']:
+      try:
+        values[field] = int(record.get(field))
+      except (TypeError, ValueError):
+        record_errors[field] = 'An integer id is required.'
+    try:
+      start_time = record.get('start_time')
+      values['start_time'] = start_time if not isinstance(start_time, str) else dateutil.parser.parse(start_time)
+      if values['start_time'] is None:
+        record_errors['start_time'] = 'This field is required.'
+    except (ValueError, OverflowError):
+      record_errors['start_time'] = 'Not a valid datetime value.'
+    if record_errors:
+      errors.append({'row': row, 'errors': record_errors})
+    else:
+      valid.append((row, show_id, values))
+
+  # referenced artists and venues are checked with one query each for the whole batch
+  valid = check_ids(Show, valid, errors)
+  artist_ids = set(artist_id for artist_id, in db.session.query(Artist.id).filter(Artist.id.in_(set(values['artist_id'] for row, show_id, values in valid))))
+  venue_ids = set(venue_id for venue_id, in db.session.query(Venue.id).filter(Venue.id.in_(set(values['venue_id'] for row, show_id, values in valid))))
+  rows = []
+  for row, show_id, values in valid:
+    if values['artist_id'] not in artist_ids:
+      errors.append({'row': row, 'errors': {'artist_id': 'No artist with this id.'}})
+    elif values['venue_id'] not in venue_ids:
+      errors.append({'row': row, 'errors': {'venue_id': 'No venue with this id.'}})
+    else:
+      if show_id is not None:
+        values['id'] = show_id
+      rows.append(values)
+
+  if rows:
+    # executemany bypasses the mapper events, so the counters are updated here
+    now = datetime.now()
+    for values in rows:
+      values['is_upcoming'] = values['start_time'] > now
+    insert_rows(Show, rows)
+    update_counters(db.session, [(values['artist_id'], values['venue_id'], values['is_upcoming']) for values in rows], 1)
+    db.session.commit()
+
+  summary['imported'] += len(rows)
+  summary['errors'].extend(sorted(errors, key=lambda error: error['row']))
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+def export_records(kind, batch_size=BATCH_SIZE):
+  # yields all venues, artists or shows in id order
+  # rows are read one batch at a time, continuing after the last id of the previous batch,
+  # so memory use does not grow with the size of the table
+  last_id = 0
+  while True:
+    if(kind == 'shows'):
+      records = export_shows(last_id, batch_size)
+    elif(kind == 'venues'):
+      records = export_entities(Venue, record_fields[kind], venue_genre, 'venue_id', last_id, batch_size)
+    else:
+      records = export_entities(Artist, record_fields[kind], artist_genre, 'artist_id', last_id, batch_size)
+    if not records:
+      return
+    for record in records:
+      yield record
+    last_id = records[-1]['id']
+
+def export_entities(model, record_fields, association, key, last_id, batch_size):
+  # city and state come from the joined City, genres from one query for the whole batch
+  fields = [field for field in record_fields if field not in ['city', 'state', 'genres']]
+  rows = db.session.query(*([getattr(model, field) for field in fields] + [City.city, City.state])) \
+    .outerjoin(City, model.city == City.id) \
+    .filter(model.id > last_id) \
+    .order_by(model.id) \
+    .limit(batch_size) \
+    .all()
+
+  records = []
+  for row in rows:
+    record = dict(zip(fields, row))
+    record['city'] = row[-2]
+    record['state'] = row[-1]
+    record['genres'] = []
+    records.append(record)
+
+  if records:
+    by_id = {record['id']: record for record in records}
+    genres = db.session.query(association.c[key], Genre.name) \
+      .join(Genre, association.c.genre_id == Genre.id) \
+      .filter(association.c[key].in_(list(by_id))) \
+      .all()
+    for entity_id, genre in genres:
+      by_id[entity_id]['genres'].append(genre)
+
+  return records
+
+def export_shows(last_id, batch_size):
+  rows = db.session.query(Show.id, Show.artist_id, Show.venue_id, Show.start_time) \
+    .filter(Show.id > last_id) \
+    .order_by(Show.id) \
+    .limit(batch_size) \
+    .all()
+  return [{'id': show_id, 'artist_id': artist_id, 'venue_id': venue_id, 'start_time': start_time.isoformat()}
+    for show_id, artist_id, venue_id, start_time in rows]
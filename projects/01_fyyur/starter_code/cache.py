@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+try:
+  import redis
+except ImportError:
+  redis = None
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# rendered pages are cached per namespace (e.g. 'venues') and key (the path and query string)
+# every namespace has a version that is part of the cache keys: invalidating a namespace
+# bumps its version, so its old entries are never read again and age out of the store
+
+class MemoryStore:
+  # in-process LRU store with a time to live, shared by the threads of one process
+  def __init__(self, max_entries, ttl):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.entries = OrderedDict()
+    self.versions = {}
+    self.lock = threading.Lock()
+
+  def version(self, namespace):
+    return self.versions.get(namespace, 0)
+
+  def bump_version(self, namespace):
+    with self.lock:
+      self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      expires_at, value = entry
+      if expires_at < time.monotonic():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value):
+    with self.lock:
+      self.entries[key] = (time.monotonic() + self.ttl, value)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+
+
+class RedisStore:
+  # store shared by all the processes using the same Redis-compatible server,
+  # so that an invalidation in one worker is seen by all of them
+  def __init__(self, url, ttl, prefix='fyyur:'):
+    if redis is None:
+      raise RuntimeError('PAGE_CACHE_REDIS_URL is set but the redis package is not installed')
+    self.client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def version(self, namespace):
+    return int(self.client.get(self.prefix + 'version:' + namespace) or 0)
+
+  def bump_version(self, namespace):
+    self.client.incr(self.prefix + 'version:' + namespace)
+
+  def get(self, key):
+    return self.client.get(self.prefix + 'page:' + key)
+
+  def set(self, key, value):
+    self.client.setex(self.prefix + 'page:' + key, self.ttl, value)
+
+
+class PageCache:
+  def __init__(self, store=None):
+    self.store = store
+
+  def configure(self, config):
+    ttl = config.get('PAGE_CACHE_TTL', 60)
+    if not config.get('PAGE_CACHE_ENABLED', True):
+      self.store = None
+    elif config.get('PAGE_CACHE_REDIS_URL'):
+      self.store = RedisStore(config['PAGE_CACHE_REDIS_URL'], ttl)
+    else:
+      self.store = MemoryStore(config.get('PAGE_CACHE_MAX_ENTRIES', 512), ttl)
+
+  def key(self, namespace, key):
+    # the key has to be computed before the page is rendered: if the namespace is invalidated
+    # while rendering, the page is then stored under the old version and never served
+    if self.store is None:
+      return None
+    return namespace + ':' + str(self.store.version(namespace)) + ':' + key
+
+  def get(self, cache_key):
+    if cache_key is None:
+      return None
+    return self.store.get(cache_key)
+
+  def set(self, cache_key, value):
+    if cache_key is not None:
+      self.store.set(cache_key, value)
+
+  def invalidate(self, *namespaces):
+    if self.store is not None:
+      for namespace in namespaces:
+        self.store.bump_version(namespace)
+
+page_cache = PageCache()
@@ -9,3 +9,27 @@ DEBUG = True
 # Connect to the database
 SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyur'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Let psycopg2 send executemany inserts (used by the bulk import) as multi-row VALUES statements
+# instead of one statement per row
+SQLALCHEMY_ENGINE_OPTIONS = {'executemany_mode': 'values'} if SQLALCHEMY_DATABASE_URI.startswith('postgresql') else {}
+
+# Number of results per page returned by venue and artist search,
+# and the upper bound a request can ask for through the limit parameter
+SEARCH_RESULTS_PER_PAGE = 10
+SEARCH_RESULTS_MAX_LIMIT = 100
+
+# Number of shows per page of the /shows listing
+SHOWS_PER_PAGE = 30
+
+# Search backend used for venue and artist names: 'trigram' (Postgres pg_trgm),
+# 'fts5' (SQLite full-text search) or 'like' (plain ILIKE)
+# when None, the backend is chosen from the database in use
+SEARCH_BACKEND = None
+
+# Cache of the rendered /venues, /artists and /shows pages (see cache.py)
+# by default entries are kept in each process, set PAGE_CACHE_REDIS_URL (e.g. redis://localhost:6379/0)
+# to share them, and their invalidations, between processes through a Redis-compatible server
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TTL = 60
+PAGE_CACHE_MAX_ENTRIES = 512
+PAGE_CACHE_REDIS_URL = None
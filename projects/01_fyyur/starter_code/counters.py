@@ -0,0 +1,75 @@
+from collections import Counter
+from datetime import datetime
+import dateutil.parser
+from sqlalchemy import event, func, select
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist keep upcoming_shows_count and past_shows_count up to date,
+# and every show records with is_upcoming which of the two counters it is counted in
+# counters change when shows are inserted or deleted, and when roll_forward() moves
+# the shows that have started since its last run from the upcoming to the past counters
+
+def update_counters(connection, shows, sign):
+  # adds (sign=1) or removes (sign=-1) shows, given as (artist_id, venue_id, is_upcoming) tuples,
+  # from the counters of their artists and venues, with one executemany per table and counter
+  for model, position in [(Artist, 0), (Venue, 1)]:
+    for is_upcoming, counter in [(True, 'upcoming_shows_count'), (False, 'past_shows_count')]:
+      deltas = Counter(show[position] for show in shows if show[2] == is_upcoming and show[position] is not None)
+      if deltas:
+        table = model.__table__
+        connection.execute(
+          table.update().where(table.c.id == db.bindparam('entity_id')).values({counter: table.c[counter] + db.bindparam('delta')}),
+          [{'entity_id': entity_id, 'delta': sign*delta} for entity_id, delta in deltas.items()])
+
+@event.listens_for(Show, 'before_insert')
+def classify_show(mapper, connection, show):
+  show.start_time = parse_start_time(show.start_time)
+  show.is_upcoming = show.start_time > datetime.now()
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+  update_counters(connection, [(show.artist_id, show.venue_id, show.is_upcoming)], 1)
+
+@event.listens_for(Show, 'after_delete')
+def uncount_deleted_show(mapper, connection, show):
+  update_counters(connection, [(show.artist_id, show.venue_id, show.is_upcoming)], -1)
+
+def parse_start_time(start_time):
+  # form submissions set start_time to the submitted string
+  if isinstance(start_time, str):
+    return dateutil.parser.parse(start_time)
+  return start_time
+
+def roll_forward(connection, now=None):
+  # moves the shows that started before now from the upcoming to the past counters
+  # the moved shows are locked, so that concurrent runs cannot move a show twice
+  # returns the number of shows moved
+  now = now or datetime.now()
+  table = Show.__table__
+  started = connection.execute(
+    select([table.c.id, table.c.artist_id, table.c.venue_id])
+      .where(table.c.is_upcoming & (table.c.start_time <= now))
+      .with_for_update()).fetchall()
+  if not started:
+    return 0
+
+  connection.execute(table.update().where(table.c.id.in_([show.id for show in started])).values(is_upcoming=False))
+  update_counters(connection, [(show.artist_id, show.venue_id, True) for show in started], -1)
+  update_counters(connection, [(show.artist_id, show.venue_id, False) for show in started], 1)
+  return len(started)
+
+def recount(connection, now=None):
+  # recomputes every flag and counter from the shows, to initialize or repair them
+  now = now or datetime.now()
+  table = Show.__table__
+  connection.execute(table.update().values(is_upcoming=table.c.start_time > now))
+  for model, key in [(Artist, table.c.artist_id), (Venue, table.c.venue_id)]:
+    for is_upcoming, counter in [(True, 'upcoming_shows_count'), (False, 'past_shows_count')]:
+      count = select([func.count(table.c.id)]) \
+        .where((key == model.__table__.c.id) & (table.c.is_upcoming == is_upcoming)) \
+        .as_scalar()
+      connection.execute(model.__table__.update().values({counter: count}))
@@ -0,0 +1,128 @@
+from sqlalchemy import event, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from models import City, Genre, Venue, artist_genre, venue_genre
+
+#----------------------------------------------------------------------------#
+# Lookup cache.
+#----------------------------------------------------------------------------#
+
+class LookupCache:
+  # process-local cache of the ids of the small City and Genre lookup tables
+  # ids resolved inside a transaction are staged on its session and only become visible
+  # to other requests once that transaction commits, and are dropped if it rolls back
+  # cities and genres are never updated, so a cached id stays valid until the row is deleted,
+  # in which case invalidate() must be called
+  def __init__(self):
+    self.cities = {}
+    self.genres = {}
+
+  def invalidate(self):
+    self.cities.clear()
+    self.genres.clear()
+
+  def stage(self, session, kind, ids):
+    session.info.setdefault('lookup_cache', {}).setdefault(kind, {}).update(ids)
+
+  def lookup(self, session, kind, key):
+    staged = session.info.get('lookup_cache', {}).get(kind, {})
+    if key in staged:
+      return staged[key]
+    return getattr(self, kind).get(key)
+
+lookup_cache = LookupCache()
+
+@event.listens_for(Session, 'after_commit')
+def publish_staged_lookups(session):
+  for kind, ids in session.info.pop('lookup_cache', {}).items():
+    getattr(lookup_cache, kind).update(ids)
+
+@event.listens_for(Session, 'after_rollback')
+def drop_staged_lookups(session):
+  session.info.pop('lookup_cache', None)
+
+#----------------------------------------------------------------------------#
+# Resolvers.
+#----------------------------------------------------------------------------#
+
+def insert_ignoring_conflicts(session, table, rows):
+  # inserts rows in a single statement, skipping the ones that already exist
+  # as defined by the unique constraints of the table
+  dialect = session.get_bind().dialect.name
+  if(dialect == 'postgresql'):
+    statement = postgresql.insert(table).on_conflict_do_nothing()
+  elif(dialect == 'sqlite'):
+    statement = table.insert().prefix_with('OR IGNORE')
+  else:
+    statement = table.insert()
+  session.execute(statement, rows)
+
+def resolve_city(session, city, state):
+  # returns the id of the (city, state) City, creating it if needed
+  return resolve_cities(session, [(city, state)])[(city, state)]
+
+def resolve_cities(session, pairs):
+  # returns a dict mapping each (city, state) pair to the id of its City, creating the missing ones
+  # all uncached cities are fetched with one query and the missing ones inserted in one statement
+  pairs = list(dict.fromkeys(pairs))
+  city_ids = {}
+  for pair in pairs:
+    city_id = lookup_cache.lookup(session, 'cities', pair)
+    if city_id is not None:
+      city_ids[pair] = city_id
+
+  uncached = [pair for pair in pairs if pair not in city_ids]
+  if uncached:
+    found = find_cities(session, uncached)
+    missing = [pair for pair in uncached if pair not in found]
+    if missing:
+      insert_ignoring_conflicts(session, City.__table__, [{'city': city, 'state': state} for city, state in missing])
+      found.update(find_cities(session, missing))
+    lookup_cache.stage(session, 'cities', found)
+    city_ids.update(found)
+
+  return city_ids
+
+def find_cities(session, pairs):
+  rows = session.query(City.city, City.state, City.id) \
+    .filter(tuple_(City.city, City.state).in_(pairs)) \
+    .all()
+  return {(city, state): city_id for city, state, city_id in rows}
+
+def resolve_genres(session, names):
+  # returns the ids of the named genres, in the same order, creating the missing ones
+  # all uncached genres are fetched with one IN query and the missing ones inserted in one statement
+  names = list(dict.fromkeys(names))
+  genre_ids = {}
+  for name in names:
+    genre_id = lookup_cache.lookup(session, 'genres', name)
+    if genre_id is not None:
+      genre_ids[name] = genre_id
+
+  uncached = [name for name in names if name not in genre_ids]
+  if uncached:
+    found = dict(session.query(Genre.name, Genre.id).filter(Genre.name.in_(uncached)))
+    missing = [name for name in uncached if name not in found]
+    if missing:
+      insert_ignoring_conflicts(session, Genre.__table__, [{'name': name} for name in missing])
+      found.update(session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)))
+    lookup_cache.stage(session, 'genres', found)
+    genre_ids.update(found)
+
+  return [genre_ids[name] for name in names]
+
+def set_genres(session, entity, genre_ids):
+  # replaces the genres of a venue or artist by writing its association rows directly,
+  # which avoids loading the Genre objects just to assign the relationship
+  if isinstance(entity, Venue):
+    association = venue_genre
+    key = 'venue_id'
+  else:
+    association = artist_genre
+    key = 'artist_id'
+
+  # a new entity needs its id before association rows can reference it
+  session.flush()
+  session.execute(association.delete().where(association.c[key] == entity.id))
+  if genre_ids:
+    session.execute(association.insert(), [{key: entity.id, 'genre_id': genre_id} for genre_id in genre_ids])
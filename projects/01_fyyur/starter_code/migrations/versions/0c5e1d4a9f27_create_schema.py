@@ -0,0 +1,91 @@
+"""create the venue, artist, show, genre and city tables
+
+Revision ID: 0c5e1d4a9f27
+Revises: 
+Create Date: 2026-10-18 10:05:12.218694
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c5e1d4a9f27'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the schema as it was before the first migration, databases created then are stamped at this revision
+    op.create_table('City',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city', sa.String(), nullable=True),
+        sa.Column('state', sa.String(length=2), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('Genre',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('Artist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('city', sa.Integer(), nullable=True),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.Column('website', sa.String(), nullable=True),
+        sa.Column('seeking_venue', sa.Boolean(), nullable=True),
+        sa.Column('seeking_description', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['city'], ['City.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table('Venue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('city', sa.Integer(), nullable=True),
+        sa.Column('address', sa.String(length=120), nullable=True),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.Column('website', sa.String(), nullable=True),
+        sa.Column('seeking_talent', sa.Boolean(), nullable=True),
+        sa.Column('seeking_description', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['city'], ['City.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table('Artist_Genre',
+        sa.Column('artist_id', sa.Integer(), nullable=True),
+        sa.Column('genre_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE')
+    )
+    op.create_table('Venue_Genre',
+        sa.Column('venue_id', sa.Integer(), nullable=True),
+        sa.Column('genre_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE')
+    )
+    op.create_table('Show',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=True),
+        sa.Column('venue_id', sa.Integer(), nullable=True),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('Show')
+    op.drop_table('Venue_Genre')
+    op.drop_table('Artist_Genre')
+    op.drop_table('Venue')
+    op.drop_table('Artist')
+    op.drop_table('Genre')
+    op.drop_table('City')
@@ -0,0 +1,32 @@
+"""add trigram indexes for venue and artist name search
+
+Revision ID: 3f1c2a9b7d10
+Revises: 0c5e1d4a9f27
+Create Date: 2026-10-18 10:12:41.512347
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = '0c5e1d4a9f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the GIN trigram indexes only exist on Postgres, other databases use the search backends in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
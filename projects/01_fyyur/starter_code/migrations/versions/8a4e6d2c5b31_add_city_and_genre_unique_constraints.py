@@ -0,0 +1,49 @@
+"""add unique constraints on city and genre natural keys
+
+Revision ID: 8a4e6d2c5b31
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 11:03:27.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c5b31'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def merge_duplicates(table, key_columns, references):
+    # keeps the row with the smallest id of every natural key, points the references to the
+    # duplicates at it and deletes the duplicates (rows with a null key part are never duplicates)
+    same_key = ' AND '.join('keep.{0} = duplicate.{0}'.format(column) for column in key_columns)
+    duplicates = 'SELECT duplicate.id FROM "{0}" duplicate, "{0}" keep WHERE {1} AND keep.id < duplicate.id'.format(
+        table, same_key)
+    kept = 'SELECT MIN(keep.id) FROM "{0}" duplicate, "{0}" keep WHERE {1} AND duplicate.id = "{{0}}".{{1}}'.format(
+        table, same_key)
+    for referencing_table, column in references:
+        op.execute('UPDATE "{0}" SET {1} = ({2}) WHERE {1} IN ({3})'.format(
+            referencing_table, column, kept.format(referencing_table, column), duplicates))
+    # the derived table lets MySQL delete from the table it selects from
+    op.execute('DELETE FROM "{0}" WHERE id IN (SELECT id FROM ({1}) duplicates)'.format(table, duplicates))
+
+
+def upgrade():
+    # the city and genre rows inserted before the lookups may be duplicated, the duplicated
+    # associations this leaves in Artist_Genre and Venue_Genre are removed by c7d93e1f4a62
+    merge_duplicates('Genre', ['name'], [('Artist_Genre', 'genre_id'), ('Venue_Genre', 'genre_id')])
+    merge_duplicates('City', ['city', 'state'], [('Artist', 'city'), ('Venue', 'city')])
+    with op.batch_alter_table('Genre') as batch_op:
+        batch_op.create_unique_constraint('Genre_name_key', ['name'])
+    with op.batch_alter_table('City') as batch_op:
+        batch_op.create_unique_constraint('uq_City_city_state', ['city', 'state'])
+
+
+def downgrade():
+    with op.batch_alter_table('City') as batch_op:
+        batch_op.drop_constraint('uq_City_city_state', type_='unique')
+    with op.batch_alter_table('Genre') as batch_op:
+        batch_op.drop_constraint('Genre_name_key', type_='unique')
@@ -0,0 +1,61 @@
+"""add show, city and genre association indexes and primary keys
+
+Revision ID: c7d93e1f4a62
+Revises: 8a4e6d2c5b31
+Create Date: 2026-10-18 14:26:09.118723
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d93e1f4a62'
+down_revision = '8a4e6d2c5b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+    op.create_index(op.f('ix_Venue_city'), 'Venue', ['city'], unique=False)
+    op.create_index(op.f('ix_Artist_city'), 'Artist', ['city'], unique=False)
+
+    # association rows without an entity or a genre, and duplicated rows, have to go
+    # before (entity, genre) can become the primary key
+    dialect = op.get_bind().dialect.name
+    for table, key in [('Artist_Genre', 'artist_id'), ('Venue_Genre', 'venue_id')]:
+        op.execute('DELETE FROM "{0}" WHERE {1} IS NULL OR genre_id IS NULL'.format(table, key))
+        if dialect == 'postgresql':
+            op.execute('DELETE FROM "{0}" a USING "{0}" b WHERE a.ctid < b.ctid '
+                       'AND a.{1} = b.{1} AND a.genre_id = b.genre_id'.format(table, key))
+        elif dialect == 'sqlite':
+            op.execute('DELETE FROM "{0}" WHERE rowid NOT IN '
+                       '(SELECT MIN(rowid) FROM "{0}" GROUP BY {1}, genre_id)'.format(table, key))
+        else:
+            # databases without row ids keep one copy of every distinct row
+            op.execute('CREATE TABLE "{0}_distinct" AS SELECT DISTINCT {1}, genre_id FROM "{0}"'.format(table, key))
+            op.execute('DELETE FROM "{0}"'.format(table))
+            op.execute('INSERT INTO "{0}" ({1}, genre_id) SELECT {1}, genre_id FROM "{0}_distinct"'.format(table, key))
+            op.execute('DROP TABLE "{0}_distinct"'.format(table))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(key, existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column('genre_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_primary_key(table + '_pkey', [key, 'genre_id'])
+
+
+def downgrade():
+    for table, key in [('Venue_Genre', 'venue_id'), ('Artist_Genre', 'artist_id')]:
+        # SQLite does not keep the name of the primary key, the naming convention gives it back
+        with op.batch_alter_table(table, naming_convention={'pk': '%(table_name)s_pkey'}) as batch_op:
+            batch_op.drop_constraint(table + '_pkey', type_='primary')
+            batch_op.alter_column('genre_id', existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column(key, existing_type=sa.Integer(), nullable=True)
+
+    op.drop_index(op.f('ix_Artist_city'), table_name='Artist')
+    op.drop_index(op.f('ix_Venue_city'), table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
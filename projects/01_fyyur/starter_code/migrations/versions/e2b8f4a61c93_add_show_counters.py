@@ -0,0 +1,45 @@
+"""add upcoming and past show counters to venues and artists
+
+Revision ID: e2b8f4a61c93
+Revises: c7d93e1f4a62
+Create Date: 2026-10-18 15:02:47.530816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8f4a61c93'
+down_revision = 'c7d93e1f4a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('is_upcoming', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.add_column('Venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Venue', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_Show_is_upcoming_start_time', 'Show', ['is_upcoming', 'start_time'], unique=False)
+
+    # same as counters.recount(), written out so that the migration does not depend on the models
+    op.execute('UPDATE "Show" SET is_upcoming = (start_time > CURRENT_TIMESTAMP)')
+    for table, key in [('Venue', 'venue_id'), ('Artist', 'artist_id')]:
+        op.execute('UPDATE "{0}" SET '
+                   'upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id AND "Show".is_upcoming), '
+                   'past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id AND NOT "Show".is_upcoming)'
+                   .format(table, key))
+
+
+def downgrade():
+    op.drop_index('ix_Show_is_upcoming_start_time', table_name='Show')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('past_shows_count')
+        batch_op.drop_column('upcoming_shows_count')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('past_shows_count')
+        batch_op.drop_column('upcoming_shows_count')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('is_upcoming')
@@ -1,31 +1,46 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 
 db = SQLAlchemy()
 
+#the gin_trgm_ops indexes of Venue and Artist need the pg_trgm extension, create_all installs it first on Postgres
+event.listen(db.metadata, 'before_create',
+  DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-#add constraints for fields
+#an entity has a genre at most once, so (entity, genre) is the primary key of the association tables
 artist_genre = db.Table('Artist_Genre',
-  db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete="CASCADE")),
-  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete="CASCADE"))
+  db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete="CASCADE"), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete="CASCADE"), primary_key=True)
   )
 
 venue_genre = db.Table('Venue_Genre',
-  db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete="CASCADE")),
-  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete="CASCADE"))
+  db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete="CASCADE"), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete="CASCADE"), primary_key=True)
   )
 
 class Show(db.Model):
   __tablename__ = 'Show'
-  
+  # shows are looked up by venue or artist and split into past and upcoming by start_time,
+  # and the /shows listing pages through them in (start_time, id) order
+  __table_args__ = (
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    db.Index('ix_Show_is_upcoming_start_time', 'is_upcoming', 'start_time'),
+  )
+
   #need the id field in order to be able to uniquely identify rows in case the same artist plays the same venue multiple times
   #initially used the artist_id and the venue_id as the primary keys, however those can have duplicates
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete="CASCADE"))
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete="CASCADE"))
   start_time = db.Column(db.DateTime, nullable=False)
+  # which counter of its venue and artist the show is counted in (see counters.py)
+  is_upcoming = db.Column(db.Boolean, nullable=False, default=True, server_default=db.false())
   artist = db.relationship('Artist', backref=db.backref('artist_show', lazy=True))
   venue = db.relationship('Venue', backref=db.backref('venue_show', lazy=True))
 
@@ -35,10 +50,14 @@ class Show(db.Model):
 
 class Venue(db.Model):
   __tablename__ = 'Venue'
+  # trigram index serving the unanchored ILIKE name search on Postgres (see search.py)
+  __table_args__ = (
+    db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String, nullable=False, unique=True)
-  city = db.Column(db.Integer, db.ForeignKey('City.id', ondelete="SET NULL"))
+  city = db.Column(db.Integer, db.ForeignKey('City.id', ondelete="SET NULL"), index=True)
   address = db.Column(db.String(120))
   phone = db.Column(db.String(120))
   genres = db.relationship('Genre', secondary=venue_genre, backref=db.backref('venues', lazy=True))
@@ -47,7 +66,11 @@ class Venue(db.Model):
   website = db.Column(db.String())
   seeking_talent = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String())
-  show = db.relationship('Show', backref=db.backref('venues', lazy=True))
+  # maintained by counters.py when shows are inserted or deleted and when they start
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  # shows are deleted through the ORM so that the counters of the other side are updated
+  show = db.relationship('Show', backref=db.backref('venues', lazy=True), cascade='all, delete-orphan')
 
   def __repr__(self):
     return f'<Venue {self.id}, {self.name}>'
@@ -55,10 +78,14 @@ class Venue(db.Model):
 
 class Artist(db.Model):
   __tablename__ = 'Artist'
+  # trigram index serving the unanchored ILIKE name search on Postgres (see search.py)
+  __table_args__ = (
+    db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String, nullable=False, unique=True)
-  city = db.Column(db.Integer, db.ForeignKey('City.id', ondelete="SET NULL"))
+  city = db.Column(db.Integer, db.ForeignKey('City.id', ondelete="SET NULL"), index=True)
   phone = db.Column(db.String(120))
   genres = db.relationship('Genre', secondary=artist_genre, backref=db.backref('artists', lazy=True))
   image_link = db.Column(db.String(500))
@@ -66,7 +93,11 @@ class Artist(db.Model):
   website = db.Column(db.String())
   seeking_venue = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String())
-  show = db.relationship('Show', backref=db.backref('artists', lazy=True))
+  # maintained by counters.py when shows are inserted or deleted and when they start
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  # shows are deleted through the ORM so that the counters of the other side are updated
+  show = db.relationship('Show', backref=db.backref('artists', lazy=True), cascade='all, delete-orphan')
 
   def __repr__(self):
     return f'<Artist {self.id}, {self.name}>'
@@ -76,7 +107,8 @@ class Genre(db.Model):
   __tablename__ = 'Genre'
 
   id = db.Column(db.Integer, primary_key=True)
-  name = db.Column(db.String)
+  # genres are resolved by name, and created with INSERT ... ON CONFLICT DO NOTHING (see lookups.py)
+  name = db.Column(db.String, unique=True)
   artist_genres = db.relationship('Artist', secondary=artist_genre)
   venue_genres = db.relationship('Venue', secondary=venue_genre)
 
@@ -85,6 +117,10 @@ class Genre(db.Model):
 
 class City(db.Model):
   __tablename__ = 'City'
+  # (city, state) is the natural key used to resolve cities (see lookups.py)
+  __table_args__ = (
+    db.UniqueConstraint('city', 'state', name='uq_City_city_state'),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   city = db.Column(db.String)
@@ -0,0 +1,133 @@
+from sqlalchemy import column, literal, select, table, func
+
+#----------------------------------------------------------------------------#
+# Search backends.
+#----------------------------------------------------------------------------#
+
+# a search backend restricts a query on a model to the rows whose column contains a search term
+# and returns it together with a rank expression for the matching rows
+# ranks are always "higher is better", so callers can simply order by rank descending
+# the same backends are used by Trivia (projects/02_trivia_api/starter/backend/search.py),
+# changes have to be made to both copies
+
+class LikeSearch:
+  # plain unanchored ILIKE, used for databases without a dedicated search index
+  def __init__(self, engine):
+    self.engine = engine
+
+  def create_index(self, model, column_name):
+    pass
+
+  def search(self, query, model, column_name, term):
+    searched_column = getattr(model, column_name)
+    return query.filter(searched_column.ilike('%'+term+'%')), literal(0)
+
+
+class TrigramSearch(LikeSearch):
+  # Postgres: the ILIKE filter is served by the pg_trgm GIN indexes declared in models.py
+  # and created by the search index migration, results are ranked by trigram similarity
+  # until the pg_trgm extension is installed (by the migration, create_all or create_index), results are not ranked
+  def __init__(self, engine):
+    super().__init__(engine)
+    self.trigrams_installed = False
+
+  def create_index(self, model, column_name):
+    names = {'table': model.__tablename__, 'column': column_name}
+    with self.engine.begin() as connection:
+      connection.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+      connection.execute(
+        'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_trgm" '
+        'ON "{table}" USING gin ("{column}" gin_trgm_ops)'.format(**names))
+    self.trigrams_installed = True
+
+  def has_trigrams(self):
+    if not self.trigrams_installed:
+      with self.engine.connect() as connection:
+        self.trigrams_installed = connection.execute(
+          "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+    return self.trigrams_installed
+
+  def search(self, query, model, column_name, term):
+    if not self.has_trigrams():
+      return super().search(query, model, column_name, term)
+    searched_column = getattr(model, column_name)
+    return query.filter(searched_column.ilike('%'+term+'%')), func.similarity(searched_column, term)
+
+
+class Fts5Search(LikeSearch):
+  # SQLite: an external content FTS5 table using the trigram tokenizer is created
+  # the first time a column is searched, and is kept in sync with its table by triggers
+  # FTS5 bm25 ranks are lower for better matches, so they are negated
+  def __init__(self, engine):
+    super().__init__(engine)
+    self.indexed = set()
+
+  def index_name(self, model, column_name):
+    return model.__tablename__+'_'+column_name+'_fts'
+
+  def create_index(self, model, column_name):
+    index = self.index_name(model, column_name)
+    if index in self.indexed:
+      return
+
+    statements = [
+      'CREATE VIRTUAL TABLE "{index}" USING fts5({column}, content="{table}", content_rowid="id", tokenize="trigram")',
+      'CREATE TRIGGER IF NOT EXISTS "{index}_ai" AFTER INSERT ON "{table}" BEGIN '
+      'INSERT INTO "{index}"(rowid, {column}) VALUES (new.id, new.{column}); END',
+      'CREATE TRIGGER IF NOT EXISTS "{index}_ad" AFTER DELETE ON "{table}" BEGIN '
+      'INSERT INTO "{index}"("{index}", rowid, {column}) VALUES (\'delete\', old.id, old.{column}); END',
+      'CREATE TRIGGER IF NOT EXISTS "{index}_au" AFTER UPDATE OF {column} ON "{table}" BEGIN '
+      'INSERT INTO "{index}"("{index}", rowid, {column}) VALUES (\'delete\', old.id, old.{column}); '
+      'INSERT INTO "{index}"(rowid, {column}) VALUES (new.id, new.{column}); END',
+      # fill the new index with the rows that are already in the table
+      'INSERT INTO "{index}"("{index}") VALUES (\'rebuild\')'
+    ]
+    names = {'index': index, 'table': model.__tablename__, 'column': column_name}
+
+    with self.engine.begin() as connection:
+      exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index,)).first()
+      if exists is None:
+        for statement in statements:
+          connection.execute(statement.format(**names))
+
+    self.indexed.add(index)
+
+  def search(self, query, model, column_name, term):
+    # the trigram tokenizer can only match terms of at least three characters
+    if len(term) < 3:
+      return super().search(query, model, column_name, term)
+
+    self.create_index(model, column_name)
+    index = self.index_name(model, column_name)
+    fts = table(index, column('rowid'), column('rank'), column(index))
+    matches = select([fts.c.rowid, fts.c.rank]) \
+      .where(fts.c[index].op('MATCH')('"'+term.replace('"', '""')+'"')) \
+      .alias('matches')
+
+    return query.join(matches, matches.c.rowid == model.id), -matches.c.rank
+
+
+search_backends = {
+  'like': LikeSearch,
+  'trigram': TrigramSearch,
+  'fts5': Fts5Search
+}
+
+# backend used for each database dialect when SEARCH_BACKEND is not configured
+default_search_backends = {
+  'postgresql': 'trigram',
+  'sqlite': 'fts5'
+}
+
+backends = {}
+
+def get_search_backend(engine, name=None):
+  # returns the search backend called name (the default one of the database if None) for an engine
+  # backends are created once per engine and name, since the FTS5 backend remembers which indexes exist
+  if name is None:
+    name = default_search_backends.get(engine.dialect.name, 'like')
+  backend = backends.get((engine, name))
+  if backend is None:
+    backend = search_backends[name](engine)
+    backends[(engine, name)] = backend
+  return backend
@@ -0,0 +1,259 @@
+import os
+import unittest
+import babel.dates
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from app import app, page_cache, format_datetime
+from models import db, Venue, Artist, Show, City, Genre
+from counters import roll_forward
+from bulk import import_records, export_records
+from lookups import lookup_cache, resolve_cities, resolve_genres
+
+# the tests run against their own database, which is emptied and recreated by every test
+# set FYYUR_TEST_DATABASE_URL to run them on another database, e.g. sqlite:///fyyur_test.db
+database_path = os.environ.get('FYYUR_TEST_DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur_test')
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class sets up a small catalog for the test cases below"""
+
+    def setUp(self):
+        """Define test variables and create a small catalog."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_path
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        if not database_path.startswith('postgresql'):
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        self.client = app.test_client
+        self.context = app.app_context()
+        self.context.push()
+
+        db.drop_all()
+        db.create_all()
+        # the ids cached by earlier tests belong to the dropped tables
+        lookup_cache.invalidate()
+        city = City(city='San Francisco', state='CA')
+        db.session.add(city)
+        db.session.flush()
+        genre = Genre(name='Jazz')
+        venue = Venue(name='The Musical Hop', city=city.id, genres=[genre])
+        artist = Artist(name='Guns N Petals', city=city.id, genres=[genre])
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        db.session.add_all([
+            Show(artist_id=artist.id, venue_id=venue.id, start_time=datetime.now() - timedelta(days=7)),
+            Show(artist_id=artist.id, venue_id=venue.id, start_time=datetime.now() + timedelta(days=7))
+        ])
+        db.session.commit()
+        self.venue_id = venue.id
+        self.artist_id = artist.id
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+
+class QueryPlanTestCase(FyyurTestCase):
+    """This class checks that the hot queries of the list and detail pages use the schema indexes"""
+
+    # returns the query plans of the statements issued by a request that read from the given table
+    def explain_request(self, path, table):
+        statements = []
+
+        def capture(connection, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            res = self.client().get(path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        self.assertEqual(res.status_code, 200)
+
+        plans = []
+        with db.engine.connect() as connection:
+            if connection.dialect.name == 'postgresql':
+                # the test tables are tiny, so make sure the planner only picks a sequential scan
+                # when no index can serve the query
+                connection.execute('SET enable_seqscan = off')
+                explain = 'EXPLAIN '
+            else:
+                explain = 'EXPLAIN QUERY PLAN '
+            for statement, parameters in statements:
+                if statement.lstrip().upper().startswith('SELECT') and '"' + table + '"' in statement:
+                    rows = connection.execute(explain + statement, parameters).fetchall()
+                    plans.append('\n'.join(str(row[-1]) for row in rows))
+        self.assertTrue(plans)
+        return plans
+
+    def assertUsesIndex(self, plans, index):
+        self.assertTrue(any(index in plan for plan in plans), '\n\n'.join(plans))
+
+    # test for GET /venues/<int:venue_id>
+    def test_venue_detail_loads_shows_with_venue_index(self):
+        plans = self.explain_request('/venues/' + str(self.venue_id), 'Show')
+        self.assertUsesIndex(plans, 'ix_Show_venue_id_start_time')
+
+    # test for GET /artists/<int:artist_id>
+    def test_artist_detail_loads_shows_with_artist_index(self):
+        plans = self.explain_request('/artists/' + str(self.artist_id), 'Show')
+        self.assertUsesIndex(plans, 'ix_Show_artist_id_start_time')
+
+    # test for GET /shows
+    def test_show_list_pages_with_start_time_index(self):
+        plans = self.explain_request('/shows', 'Show')
+        self.assertUsesIndex(plans, 'ix_Show_start_time_id')
+
+    # test for GET /venues/<int:venue_id>
+    def test_venue_detail_loads_genres_with_association_primary_key(self):
+        plans = self.explain_request('/venues/' + str(self.venue_id), 'Venue_Genre')
+        # the primary key index is named by the constraint on Postgres, and automatically on SQLite
+        index = 'Venue_Genre_pkey' if db.engine.dialect.name == 'postgresql' else 'sqlite_autoindex_Venue_Genre'
+        self.assertUsesIndex(plans, index)
+
+
+class ShowCounterTestCase(FyyurTestCase):
+    """This class checks that the show counters of venues and artists follow the shows"""
+
+    def assertCounters(self, model, entity_id, upcoming, past):
+        entity = model.query.get(entity_id)
+        self.assertEqual((entity.upcoming_shows_count, entity.past_shows_count), (upcoming, past))
+
+    def test_counters_count_inserted_shows(self):
+        self.assertCounters(Venue, self.venue_id, 1, 1)
+        self.assertCounters(Artist, self.artist_id, 1, 1)
+
+    # test for POST /shows/create
+    def test_counters_count_submitted_show(self):
+        start_time = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        res = self.client().post('/shows/create', data={'artist_id': self.artist_id, 'venue_id': self.venue_id, 'start_time': start_time})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertCounters(Venue, self.venue_id, 2, 1)
+        self.assertCounters(Artist, self.artist_id, 2, 1)
+
+    # test for DELETE /venues/<venue_id>
+    def test_deleting_venue_uncounts_its_shows_from_artists(self):
+        res = self.client().delete('/venues/' + str(self.venue_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Show.query.count(), 0)
+        self.assertCounters(Artist, self.artist_id, 0, 0)
+
+    def test_roll_forward_moves_started_shows_to_past(self):
+        moved = roll_forward(db.session.connection(), now=datetime.now() + timedelta(days=8))
+        db.session.commit()
+
+        self.assertEqual(moved, 1)
+        self.assertCounters(Venue, self.venue_id, 0, 2)
+        self.assertCounters(Artist, self.artist_id, 0, 2)
+        self.assertEqual(roll_forward(db.session.connection(), now=datetime.now() + timedelta(days=8)), 0)
+
+
+class PageCacheTestCase(FyyurTestCase):
+    """This class checks that the page cache keeps streaming the pages it caches"""
+
+    def setUp(self):
+        super().setUp()
+        page_cache.configure({'PAGE_CACHE_TTL': 60})
+
+    def tearDown(self):
+        page_cache.configure(app.config)
+        super().tearDown()
+
+    # test for GET /shows
+    def test_streamed_shows_page_is_cached_once_sent(self):
+        res = self.client().get('/shows', buffered=False)
+        self.assertTrue(res.is_streamed)
+        cache_key = page_cache.key('shows', '/shows?')
+        self.assertIsNone(page_cache.get(cache_key))
+
+        body = b''.join(res.response)
+        res.close()
+        self.assertIn(b'Guns N Petals', body)
+        self.assertEqual(page_cache.get(cache_key), body)
+
+        res = self.client().get('/shows')
+        self.assertEqual(res.get_data(), body)
+
+    # test for GET /shows
+    def test_aborted_shows_page_is_not_cached(self):
+        res = self.client().get('/shows', buffered=False)
+        next(iter(res.response))
+        res.close()
+
+        self.assertIsNone(page_cache.get(page_cache.key('shows', '/shows?')))
+
+class BulkTestCase(FyyurTestCase):
+    """This class checks that exported records can be imported into another database"""
+
+    def test_export_import_round_trip_keeps_show_links(self):
+        # the ids of San Francisco and Jazz in this database are cached
+        resolve_cities(db.session, [('San Francisco', 'CA')])
+        resolve_genres(db.session, ['Jazz'])
+        db.session.commit()
+        exported = {kind: list(export_records(kind)) for kind in ['venues', 'artists', 'shows']}
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        lookup_cache.invalidate()
+        # the other database already has a venue, with a different id than the exported one
+        city = City(city='New York', state='NY')
+        db.session.add(city)
+        db.session.flush()
+        db.session.add(Venue(id=self.venue_id + 1, name='The Dueling Pianos Bar', city=city.id))
+        db.session.commit()
+
+        for kind in ['venues', 'artists', 'shows']:
+            summary = import_records(kind, exported[kind])
+            self.assertEqual(summary, {'imported': len(exported[kind]), 'errors': []})
+
+        shows = Show.query.order_by(Show.id).all()
+        self.assertEqual(len(shows), 2)
+        for show in shows:
+            self.assertEqual(show.venue.name, 'The Musical Hop')
+            self.assertEqual(show.artist.name, 'Guns N Petals')
+        venue = Venue.query.get(self.venue_id)
+        self.assertEqual((venue.venue_city.city, venue.venue_city.state), ('San Francisco', 'CA'))
+        self.assertEqual([genre.name for genre in venue.genres], ['Jazz'])
+        artist = Artist.query.get(self.artist_id)
+        self.assertEqual((artist.artist_city.city, artist.artist_city.state), ('San Francisco', 'CA'))
+        self.assertEqual([genre.name for genre in artist.genres], ['Jazz'])
+
+        # records without id get new ids after the imported ones
+        summary = import_records('venues', [{'name': 'Park Square Live Music', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '415-000-1234', 'genres': ['Jazz'], 'facebook_link': ''}])
+        self.assertEqual(summary['errors'], [])
+        venue = Venue.query.filter_by(name='Park Square Live Music').one()
+        self.assertEqual(venue.id, self.venue_id + 2)
+        self.assertEqual(venue.venue_city.city, 'San Francisco')
+        self.assertEqual([genre.name for genre in venue.genres], ['Jazz'])
+
+    def test_import_rejects_used_ids(self):
+        summary = import_records('venues', [{'id': self.venue_id, 'name': 'Another Venue', 'city': 'San Francisco',
+            'state': 'CA', 'phone': '415-000-1234', 'genres': ['Jazz']}])
+
+        self.assertEqual(summary['imported'], 0)
+        self.assertEqual(summary['errors'], [{'row': 1, 'errors': {'id': 'A record with the same id already exists.'}}])
+
+class DatetimeFilterTestCase(unittest.TestCase):
+    """This class checks that the datetime filter resolves format names like Babel does"""
+
+    def test_babel_format_names_use_locale_patterns(self):
+        start_time = datetime(2035, 4, 1, 20, 0)
+        for format in ['short', 'long']:
+            for locale in ['en_US', 'de_DE']:
+                self.assertEqual(format_datetime(start_time, format, locale),
+                    babel.dates.format_datetime(start_time.replace(tzinfo=babel.dates.UTC), format, locale=locale))
+
+    def test_fyyur_formats_and_patterns(self):
+        start_time = datetime(2035, 4, 1, 20, 0)
+        self.assertEqual(format_datetime(start_time, 'full', 'en_US'), 'Sunday April, 1, 2035 at 8:00PM')
+        self.assertEqual(format_datetime(start_time, 'yyyy-MM-dd', 'en_US'), '2035-04-01')
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
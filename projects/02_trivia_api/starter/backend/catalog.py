@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+import time
+
+from models import Category
+
+'''
+Category catalog
+    categories almost never change, so every process keeps them in memory
+    instead of querying the categories table on every request
+    the catalog is read again after CATEGORY_CATALOG_TTL seconds, so that changes made
+    by other processes are eventually picked up, or as soon as it is invalidated
+'''
+
+CATEGORY_CATALOG_TTL = 300
+
+'''
+CategoryCatalog
+    invalidating the catalog bumps its version and drops the loaded categories
+    the ETag is computed from the content of the catalog, so that all the processes
+    serving the same categories send the same ETag
+'''
+class CategoryCatalog:
+    def __init__(self, ttl=CATEGORY_CATALOG_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self.loaded = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.loaded = None
+
+    def load(self):
+        loaded = self.loaded
+        if loaded is not None and loaded['expires_at'] > time.monotonic():
+            return loaded
+
+        with self.lock:
+            loaded = self.loaded
+            if loaded is not None and loaded['expires_at'] > time.monotonic():
+                return loaded
+
+            types = {category.id: category.type for category in Category.query.order_by(Category.id)}
+            content = json.dumps(sorted(types.items())).encode('utf-8')
+            self.loaded = {
+                'expires_at': time.monotonic() + self.ttl,
+                'version': self.version,
+                'types': types,
+                'etag': hashlib.sha1(content).hexdigest()
+            }
+            return self.loaded
+
+    '''
+    types()
+        returns all categories as a dictionary with id: type as key-value pairs
+    '''
+    def types(self):
+        return self.load()['types']
+
+    def etag(self):
+        return self.load()['etag']
+
+    '''
+    get(category_id)
+        returns the category formatted as a dictionary as defined in models.py,
+        or None if there is no category with that id
+    '''
+    def get(self, category_id):
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            return None
+        category_type = self.types().get(category_id)
+        if category_type is None:
+            return None
+        return {
+            'id': category_id,
+            'type': category_type
+        }
+
+category_catalog = CategoryCatalog()
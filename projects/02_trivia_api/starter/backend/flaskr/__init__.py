@@ -2,31 +2,98 @@
 # in API Development and Documentation course
 
 import os
-from flask import Flask, request, abort, jsonify
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import Flask, request, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import func
 import random
+import click
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, QuizSession
+from search import get_search_backend
+from quiz import question_pool
+from catalog import category_catalog
+from json_provider import jsonify
+from ingest import read_psql_questions, read_json_questions, ingest_questions, BATCH_SIZE
 
 QUESTIONS_PER_PAGE = 10
+# number of seconds a cached question count is reused, see count_questions
+QUESTION_COUNT_TTL = 60
+
+# number of seconds clients may reuse the list of categories
+CATEGORIES_MAX_AGE = 60
+# number of seconds after its last question that a server-side quiz expires
+QUIZ_SESSION_TTL = 3600
+
+# cached question counts by listing, as (expiry time, count)
+question_counts = {}
+
+# method to drop everything cached about the questions of this process,
+# called whenever a question is created or deleted
+def questions_changed():
+    question_counts.clear()
+    question_pool.invalidate()
+
+# method to count the questions returned by a query with a single COUNT(*)
+# if a key is given (e.g. 'all' or a category id), the count is cached under that key
+# for QUESTION_COUNT_TTL seconds, or until a question is created or deleted in this process
+def count_questions(query, key=None):
+    if key is not None:
+        cached = question_counts.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+    total = query.with_entities(func.count(Question.id)).order_by(None).scalar()
+
+    if key is not None:
+        question_counts[key] = (time.monotonic() + QUESTION_COUNT_TTL, total)
+    return total
 
 # method to format questions by page numbers
+# only the requested page is fetched from the database, with LIMIT and OFFSET
 # if a page number is given that would require more items than available
 # in the database in order to display something, throw a 404 error
-# questions are formatted as a dictionary
+# queries ordered by id can instead be paged with an after argument, the id of the last question
+# of the previous page, which seeks directly to the next page however deep it is
+# questions are selected as plain columns and formatted as a dictionary
 # to make them easily convertible to JSON to send as a response
-def paginate_questions(request, questions):
+def paginate_questions(request, query, total, keyset=False):
     page = request.args.get('page', 1, type=int)
+    after = request.args.get('after', None, type=int)
     start = (page - 1)*QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
 
-    if(len(questions) < start):
+    if keyset and after is not None:
+        query = query.filter(Question.id > after)
+    elif(total < start):
         abort(404)
     else:
-        requested_questions = questions[start:end]
-        formatted_questions = [question.format() for question in requested_questions]
-        return formatted_questions
+        query = query.offset(start)
+
+    rows = query.with_entities(*Question.format_columns()).limit(QUESTIONS_PER_PAGE).all()
+    formatted_questions = [Question.format_row(row) for row in rows]
+    return formatted_questions
+
+# method to pick a random question of a category (None for all categories)
+# that is not in previous_questions, see quiz.py
+# returns None when every question of the category has been asked
+def pick_quiz_question(category, previous_questions):
+    query = db.session.query(Question.id)
+    if category is not None:
+        query = query.filter(Question.category == category)
+
+    while True:
+        question_id = question_pool.pick(query, category, previous_questions)
+        if question_id is None:
+            return None
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question
+        # the question was deleted by another process since the ids were loaded
+        question_pool.invalidate()
 
 
 def create_app(test_config=None):
@@ -43,48 +110,44 @@ def create_app(test_config=None):
         return response
 
     # get all questions
-    # returns paginated questions,
+    # returns paginated questions, in id order,
     # all categories formatted as a dictionary with id: type as key-value pairs,
     # number of total questions,
-    # if there are any questions in the database,
+    # if there are any questions on the page,
     # return the category of the first question as the current category
     @app.route('/questions')
     def get_questions():
 
-        questions = Question.query.all()
-        categories = Category.query.all()
-        formatted_questions = paginate_questions(request, questions)
-        formatted_categories = {}
+        questions = Question.query.order_by(Question.id)
+        total_questions = count_questions(questions, 'all')
+        formatted_questions = paginate_questions(request, questions, total_questions, keyset=True)
+        formatted_categories = category_catalog.types()
         current_category = None
 
-        if (len(questions) > 0):
-            current_category = Category.query.get(questions[0].category).format()
-
-        for category in categories:
-            formatted_categories[category.id] = category.type
+        if (len(formatted_questions) > 0):
+            current_category = category_catalog.get(formatted_questions[0]['category'])
 
         return jsonify({
             'success': True,
             'questions': formatted_questions,
-            'total_questions': len(questions),
+            'total_questions': total_questions,
             'categories': formatted_categories,
             'currentCategory': current_category
         })
 
     # get all categories
     # returns all categories formatted as a dictionary with id: type as key-value pairs
+    # the response carries the ETag of the category catalog and may be cached by clients
+    # for CATEGORIES_MAX_AGE seconds, requests with a matching If-None-Match get an empty 304
     @app.route('/categories')
     def get_categories():
-        categories = Category.query.all()
-        formatted_categories = {}
-
-        for category in categories:
-            formatted_categories[category.id] = category.type
-
-        return jsonify({
+        response = jsonify({
             'success': True,
-            'categories': formatted_categories
+            'categories': category_catalog.types()
         })
+        response.set_etag(category_catalog.etag())
+        response.headers['Cache-Control'] = 'public, max-age=' + str(CATEGORIES_MAX_AGE)
+        return response.make_conditional(request)
 
     # get all questions for a given category
     # return paginated questions,
@@ -95,19 +158,20 @@ def create_app(test_config=None):
     # but in the frontend it is defined as GET, so following the frontend
     @app.route('/categories/<int:category_id>/questions')
     def get_questions_by_category(category_id):
-        category = Category.query.get(category_id)
+        category = category_catalog.get(category_id)
 
         if category is None:
             abort(422)
         else:
-            questions = Question.query.filter_by(category=category_id).all()
-            formatted_questions = paginate_questions(request, questions)
+            questions = Question.query.filter_by(category=category_id).order_by(Question.id)
+            total_questions = count_questions(questions, category_id)
+            formatted_questions = paginate_questions(request, questions, total_questions, keyset=True)
 
             return jsonify({
                 'success': True,
                 'questions': formatted_questions,
-                'totalQuestions': len(questions),
-                'currentCategory': category.format()
+                'totalQuestions': total_questions,
+                'currentCategory': category
               })
 
     # delete a given question
@@ -120,6 +184,7 @@ def create_app(test_config=None):
                 abort(422)
             else:
                 question.delete()
+                questions_changed()
                 return jsonify({
                     'success': True
                 })
@@ -129,7 +194,8 @@ def create_app(test_config=None):
     # method to search questions or to create a new question
     #
     # the arguments passed in the request body will determine which operation is executed
-    # if a searchTerm is given, then all questions that contain it as a case insensitive substring will be returned
+    # if a searchTerm is given, then all questions that contain it as a case insensitive substring will be returned,
+    # best matches first as ranked by the search backend of the database (see search.py)
     # returns paginated questions, number of questions and category of first question if any are found
     #
     # otherwise, the method expects the following arguments: question, answer, difficulty, category
@@ -142,18 +208,19 @@ def create_app(test_config=None):
         search_term = body.get('searchTerm', None)
 
         if search_term is not None:
-            search_term = '%'+search_term+'%'
-            questions = Question.query.filter(Question.question.ilike(search_term)).all()
-            formatted_questions = paginate_questions(request, questions)
+            search_backend = get_search_backend(db.engine, app.config.get('SEARCH_BACKEND'))
+            search_query, rank = search_backend.search(Question.query, Question, 'question', search_term)
+            total_questions = count_questions(search_query)
+            formatted_questions = paginate_questions(request, search_query.order_by(rank.desc(), Question.id), total_questions)
             current_category = None
 
-            if (len(questions) > 0):
-                current_category = Category.query.get(questions[0].category).format()
+            if (len(formatted_questions) > 0):
+                current_category = category_catalog.get(formatted_questions[0]['category'])
 
             return jsonify({
                 'success': True,
                 'questions': formatted_questions,
-                'totalQuestions': len(questions),
+                'totalQuestions': total_questions,
                 'currentCategory': current_category
             })
         else:
@@ -168,6 +235,7 @@ def create_app(test_config=None):
             try:
                 new_question = Question(question=question, answer=answer, category=category, difficulty=difficulty)
                 new_question.insert()
+                questions_changed()
 
                 return jsonify({
                     'success': True,
@@ -177,31 +245,135 @@ def create_app(test_config=None):
                 abort(422)
 
     # get question to play quiz
-    # expects previous_questions as a list of ids and an optional quiz_category as a dictionary as defined in models.py
-    # returns a question that is not in the previous_questions list
+    # questions are picked at random among the questions of the category that were not asked yet
+    #
+    # a quiz can be played in two ways:
+    # - without session: every request gives previous_questions as a list of ids
+    #   and an optional quiz_category as a dictionary as defined in models.py
+    # - with a server-side session: the first request gives start_session as true and an optional
+    #   quiz_category, and returns a quiz_id along with the question;
+    #   the following requests only give that quiz_id, the server remembers the questions already asked
     # if no category is provided, returns a question for any category
-    # if no previous_questions are provided, will throw a 422 error so at least an empty list of questions is expected
+    # once every question of the category has been asked, the returned question is None
+    # if the quiz_id is unknown or has expired, a 404 error will be thrown
+    # if the input is badly formatted, a 422 error will be thrown
     @app.route('/quizzes', methods=['POST'])
     def get_quiz_question():
-        try:
-            body = request.get_json()
-            previous_questions = body.get('previous_questions', None)
-            category = body.get('quiz_category', None)
-            next_question = None
+        body = request.get_json()
+        if body is None:
+            abort(422)
+        quiz_id = body.get('quiz_id', None)
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=QUIZ_SESSION_TTL)
+        quiz = None
+
+        if quiz_id is not None:
+            quiz = QuizSession.query.get(str(quiz_id))
+            if quiz is None or quiz.updated_at < expired:
+                abort(404)
 
-            if (category is None or category['id'] == 0):
-                next_question = Question.query.filter(~Question.id.in_(previous_questions)).first()
+        try:
+            if quiz is not None:
+                category = quiz.category
+                previous_questions = quiz.get_previous_questions()
             else:
-                next_question = Question.query.filter_by(category=category['id']).filter(~Question.id.in_(previous_questions)).first()
-            if next_question is not None:
-                next_question = next_question.format()
+                quiz_category = body.get('quiz_category', None)
+                category = None
+                if (quiz_category is not None and quiz_category['id'] != 0):
+                    category = int(quiz_category['id'])
+
+                if body.get('start_session', False) is True:
+                    # start a new server-side quiz, expired ones are cleaned up on the way
+                    QuizSession.query.filter(QuizSession.updated_at < expired).delete()
+                    quiz = QuizSession(uuid.uuid4().hex, category, now)
+                    db.session.add(quiz)
+                    previous_questions = []
+                else:
+                    previous_questions = [int(question_id) for question_id in body['previous_questions']]
+
+            next_question = pick_quiz_question(category, previous_questions)
+
+            if quiz is not None:
+                if next_question is not None:
+                    quiz.add_previous_question(next_question.id, now)
+                db.session.commit()
+        except:
+            db.session.rollback()
+            abort(422)
 
-            return jsonify({
-                'success': True,
-                'question': next_question
-            })
+        response = {
+            'success': True,
+            'question': next_question.format() if next_question is not None else None
+        }
+        if quiz is not None:
+            response['quiz_id'] = quiz.id
+
+        return jsonify(response)
+
+    # create questions in bulk
+    # expects a list of questions, each with the same arguments as when creating a single question,
+    # either as the request body or as the questions argument of the request body
+    # every question is validated on its own: the valid ones are inserted in a single transaction,
+    # the invalid ones are skipped and returned with their row number (starting at 1) and errors by field
+    # success is False if any question was skipped
+    # returns the number of inserted questions and the errors
+    @app.route('/questions/batch', methods=['POST'])
+    def create_questions():
+        records = read_json_questions(request.get_json())
+
+        if records is None:
+            abort(400)
+
+        try:
+            summary = ingest_questions(records, category_catalog.types())
+            db.session.commit()
         except:
+            db.session.rollback()
             abort(422)
+        questions_changed()
+
+        return jsonify({
+            'success': len(summary['errors']) == 0,
+            'inserted': summary['inserted'],
+            'errors': summary['errors']
+        })
+
+    # load questions in bulk from the command line, e.g. flask load-questions pack.psql
+    # reads the questions table of a pg_dump file such as trivia.psql (the ids of the dump are not kept),
+    # or a JSON list of questions (or an object with a questions list) as accepted by POST /questions/batch
+    # the questions are inserted in a single transaction
+    @app.cli.command('load-questions')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'data_format', type=click.Choice(['psql', 'json']), default=None,
+                  help='Format of the file, guessed from its extension by default.')
+    @click.option('--batch-size', type=int, default=BATCH_SIZE)
+    def load_questions_command(source, data_format, batch_size):
+        """Load questions from a pg_dump file or a JSON file."""
+        if data_format is None:
+            data_format = 'json' if source.name.endswith('.json') else 'psql'
+        if data_format == 'json':
+            records = read_json_questions(json.load(source))
+            if records is None:
+                raise click.ClickException('the JSON file has to be a list of questions or an object with a questions list')
+        else:
+            records = read_psql_questions(source)
+
+        summary = ingest_questions(records, category_catalog.types(), batch_size)
+        db.session.commit()
+        questions_changed()
+
+        for error in summary['errors']:
+            click.echo('row {}: {}'.format(error['row'], error['errors']), err=True)
+        click.echo('inserted {} questions, {} errors'.format(summary['inserted'], len(summary['errors'])))
+
+    # create the index used to search questions, e.g. flask create-search-index
+    # on Postgres it installs the pg_trgm extension, which needs the rights of the database owner
+    # (or a superuser), so it is run once when deploying rather than when the app starts
+    @app.cli.command('create-search-index')
+    def create_search_index_command():
+        """Create the index used to search questions."""
+        get_search_backend(db.engine, app.config.get('SEARCH_BACKEND')).create_index(Question, 'question')
+        click.echo('created the search index')
 
     # Error Handlers
 
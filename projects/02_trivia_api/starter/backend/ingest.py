@@ -0,0 +1,123 @@
+from models import db, Question
+
+'''
+Question ingest
+    questions are loaded in bulk from lists of dictionaries with the same fields as POST /questions
+    (question, answer, difficulty, category), or from the COPY block of the questions table
+    of a pg_dump file such as trivia.psql
+    every question is validated on its own and invalid ones are reported with their row number,
+    the valid ones are inserted with one executemany per batch, all in a single transaction
+'''
+
+# number of questions inserted with each executemany
+BATCH_SIZE = 1000
+
+COPY_NULL = '\\N'
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v', '\\': '\\'}
+
+'''
+read_psql_questions(lines)
+    yields the rows of the questions table found in the lines of a pg_dump file,
+    as dictionaries keyed by the column names of the COPY statement
+'''
+def read_psql_questions(lines):
+    columns = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if columns is None:
+            if line.startswith('COPY ') and line.split()[1].split('.')[-1] == 'questions':
+                columns = [column.strip() for column in line[line.index('(') + 1:line.index(')')].split(',')]
+        elif line == '\\.':
+            return
+        else:
+            yield dict(zip(columns, [read_copy_value(value) for value in line.split('\t')]))
+
+'''
+read_json_questions(data)
+    returns the list of questions of a decoded JSON document, given either as a list
+    or as the questions argument of an object, None if the document has neither
+'''
+def read_json_questions(data):
+    records = data.get('questions', None) if isinstance(data, dict) else data
+    return records if isinstance(records, list) else None
+
+def read_copy_value(value):
+    if value == COPY_NULL:
+        return None
+    if '\\' not in value:
+        return value
+
+    characters = []
+    escaped = False
+    for character in value:
+        if escaped:
+            characters.append(COPY_ESCAPES.get(character, character))
+            escaped = False
+        elif character == '\\':
+            escaped = True
+        else:
+            characters.append(character)
+    return ''.join(characters)
+
+'''
+validate_question(record, category_ids)
+    returns the values to insert for a record and the errors found in it, by field
+    question and answer are required, difficulty and category are optional integers
+    and category has to be one of category_ids
+'''
+def validate_question(record, category_ids):
+    values = {}
+    errors = {}
+
+    if not isinstance(record, dict):
+        return values, {'question': 'Expected an object with question, answer, difficulty and category.'}
+
+    for field in ['question', 'answer']:
+        value = record.get(field)
+        if value is None or value == '':
+            errors[field] = 'This field is required.'
+        else:
+            values[field] = str(value)
+
+    for field in ['difficulty', 'category']:
+        value = record.get(field)
+        if value is None or value == '':
+            values[field] = None
+            continue
+        try:
+            values[field] = int(value)
+        except (TypeError, ValueError):
+            errors[field] = 'An integer is required.'
+
+    if values.get('category') is not None and values['category'] not in category_ids:
+        errors['category'] = 'No category with this id.'
+
+    return values, errors
+
+'''
+ingest_questions(records, category_ids, batch_size)
+    validates and inserts the records in the current transaction, which the caller commits
+    returns the number of inserted questions and the errors, as a list of
+    {'row': row number starting at 1, 'errors': errors by field}
+'''
+def ingest_questions(records, category_ids, batch_size=BATCH_SIZE):
+    summary = {'inserted': 0, 'errors': []}
+    batch = []
+
+    for row, record in enumerate(records, 1):
+        values, errors = validate_question(record, category_ids)
+        if errors:
+            summary['errors'].append({'row': row, 'errors': errors})
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            insert_questions(batch, summary)
+            batch = []
+    if batch:
+        insert_questions(batch, summary)
+
+    return summary
+
+def insert_questions(batch, summary):
+    db.session.execute(Question.__table__.insert(), batch)
+    summary['inserted'] += len(batch)
@@ -1,8 +1,10 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Index, create_engine, inspect
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+
 database_name = "trivia"
 database_path = "postgresql://postgres@{}/{}".format('localhost:5432', database_name)
 
@@ -11,6 +13,8 @@ db = SQLAlchemy()
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    and upgrades the questions table of existing databases (see upgrade_questions_table)
+    the index used to search questions is created once by flask create-search-index (see search.py)
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
@@ -18,6 +22,32 @@ def setup_db(app, database_path=database_path):
     db.app = app
     db.init_app(app)
     db.create_all()
+    upgrade_questions_table(db.engine)
+
+'''
+upgrade_questions_table(engine)
+    brings a questions table created before category became an integer foreign key
+    (e.g. restored from trivia.psql) to the current model:
+    the category column is converted to integer, categories that do not exist are cleared,
+    and the foreign key and the indexes on (category, id) and difficulty are added
+    every step is skipped when already done, so it is safe to run on every start
+    SQLite cannot alter columns or add foreign keys, only the indexes are added there
+'''
+def upgrade_questions_table(engine):
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            category_column = next(column for column in inspector.get_columns('questions') if column['name'] == 'category')
+            if not isinstance(category_column['type'], Integer):
+                connection.execute('ALTER TABLE questions ALTER COLUMN category TYPE integer USING category::integer')
+            if not inspector.get_foreign_keys('questions'):
+                connection.execute('UPDATE questions SET category = NULL '
+                                   'WHERE category NOT IN (SELECT id FROM categories)')
+                connection.execute('ALTER TABLE questions ADD CONSTRAINT questions_category_fkey '
+                                   'FOREIGN KEY (category) REFERENCES categories (id)')
+        for index in Question.__table__.indexes:
+            connection.execute('CREATE INDEX IF NOT EXISTS {} ON questions ({})'.format(
+                index.name, ', '.join(column.name for column in index.columns)))
 
 '''
 Question
@@ -25,12 +55,15 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (
+    Index('ix_questions_category_id', 'category', 'id'),
+  )
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
-  difficulty = Column(Integer)
+  category = Column(Integer, ForeignKey('categories.id'))
+  difficulty = Column(Integer, index=True)
 
   def __init__(self, question, answer, category, difficulty):
     self.question = question
@@ -38,6 +71,14 @@ class Question(db.Model):
     self.category = category
     self.difficulty = difficulty
 
+  # clients may send category ids and difficulties as strings (e.g. from a select),
+  # they are stored as integers
+  @validates('category', 'difficulty')
+  def validate_integer(self, key, value):
+    if isinstance(value, str):
+      return int(value)
+    return value
+
   def insert(self):
     db.session.add(self)
     db.session.commit()
@@ -58,6 +99,22 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+  # columns to select to format questions with format_row, without loading Question objects
+  @classmethod
+  def format_columns(cls):
+    return (cls.id, cls.question, cls.answer, cls.category, cls.difficulty)
+
+  # same dictionary as format(), built from a row of the format_columns()
+  @staticmethod
+  def format_row(row):
+    return {
+      'id': row[0],
+      'question': row[1],
+      'answer': row[2],
+      'category': row[3],
+      'difficulty': row[4]
+    }
+
 '''
 Category
 
@@ -75,4 +132,31 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+QuizSession
+    server-side state of a quiz being played: its category (None for all categories)
+    and the ids of the questions already asked, so clients only send the quiz id
+
+'''
+class QuizSession(db.Model):
+  __tablename__ = 'quiz_sessions'
+
+  id = Column(String, primary_key=True)
+  category = Column(Integer)
+  previous_questions = Column(Text, nullable=False, default='[]')
+  updated_at = Column(DateTime, nullable=False, index=True)
+
+  def __init__(self, id, category, updated_at):
+    self.id = id
+    self.category = category
+    self.previous_questions = '[]'
+    self.updated_at = updated_at
+
+  def get_previous_questions(self):
+    return json.loads(self.previous_questions)
+
+  def add_previous_question(self, question_id, updated_at):
+    self.previous_questions = json.dumps(self.get_previous_questions() + [question_id])
+    self.updated_at = updated_at
@@ -0,0 +1,64 @@
+import random
+import time
+
+'''
+Quiz questions
+    quiz questions are picked uniformly at random among the questions of a category
+    that the player has not seen yet
+    the ids of the questions of each category are loaded once and kept in memory,
+    so picking a question costs a few random draws instead of a NOT IN query over the table
+'''
+
+# number of seconds the question ids of a category are reused before being read again,
+# so that questions created or deleted by other processes are eventually picked up
+QUESTION_IDS_TTL = 300
+
+# number of random draws among all the ids of a category before falling back
+# to drawing among the unseen ids only
+MAX_DRAWS = 8
+
+'''
+QuestionPool
+    ids of the questions of each category, with None standing for all the categories
+'''
+class QuestionPool:
+    def __init__(self, ttl=QUESTION_IDS_TTL):
+        self.ttl = ttl
+        self.ids = {}
+
+    def invalidate(self):
+        self.ids = {}
+
+    def question_ids(self, query, category):
+        cached = self.ids.get(category)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        ids = [question_id for question_id, in query]
+        self.ids[category] = (time.monotonic() + self.ttl, ids)
+        return ids
+
+    '''
+    pick(query, category, seen)
+        returns the id of a random question of the category that is not in seen,
+        or None if every question has been seen
+        query has to select the ids of the questions of the category, it is only run
+        when the ids of the category are not cached
+    '''
+    def pick(self, query, category, seen):
+        ids = self.question_ids(query, category)
+        seen = set(seen)
+
+        # while most of the questions are unseen, a few draws among all of them find one
+        if len(seen) < len(ids) // 2:
+            for draw in range(MAX_DRAWS):
+                question_id = random.choice(ids)
+                if question_id not in seen:
+                    return question_id
+
+        remaining = [question_id for question_id in ids if question_id not in seen]
+        if not remaining:
+            return None
+        return random.choice(remaining)
+
+question_pool = QuestionPool()
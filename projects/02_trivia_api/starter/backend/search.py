@@ -0,0 +1,143 @@
+from sqlalchemy import column, literal, select, table, func
+
+'''
+Search backends
+    a search backend restricts a query on a model to the rows whose column contains a search term
+    and returns it together with a rank expression for the matching rows
+    ranks are always "higher is better", so callers can simply order by rank descending
+    the same backends are used by Fyyur (projects/01_fyyur/starter_code/search.py),
+    changes have to be made to both copies
+'''
+
+'''
+LikeSearch
+    plain unanchored ILIKE, used for databases without a dedicated search index
+'''
+class LikeSearch:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def create_index(self, model, column_name):
+        pass
+
+    def search(self, query, model, column_name, term):
+        searched_column = getattr(model, column_name)
+        return query.filter(searched_column.ilike('%' + term + '%')), literal(0)
+
+'''
+TrigramSearch
+    Postgres: the ILIKE filter is served by a pg_trgm GIN index
+    and results are ranked by trigram similarity to the search term
+    until the pg_trgm extension is installed (by create_index), results are not ranked
+'''
+class TrigramSearch(LikeSearch):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.trigrams_installed = False
+
+    def create_index(self, model, column_name):
+        names = {'table': model.__tablename__, 'column': column_name}
+        with self.engine.begin() as connection:
+            connection.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_trgm" '
+                'ON "{table}" USING gin ("{column}" gin_trgm_ops)'.format(**names))
+        self.trigrams_installed = True
+
+    def has_trigrams(self):
+        if not self.trigrams_installed:
+            with self.engine.connect() as connection:
+                self.trigrams_installed = connection.execute(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+        return self.trigrams_installed
+
+    def search(self, query, model, column_name, term):
+        if not self.has_trigrams():
+            return super().search(query, model, column_name, term)
+        searched_column = getattr(model, column_name)
+        return query.filter(searched_column.ilike('%' + term + '%')), func.similarity(searched_column, term)
+
+'''
+Fts5Search
+    SQLite: an external content FTS5 table using the trigram tokenizer,
+    kept in sync with its table by triggers
+    FTS5 bm25 ranks are lower for better matches, so they are negated
+'''
+class Fts5Search(LikeSearch):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.indexed = set()
+
+    def index_name(self, model, column_name):
+        return model.__tablename__ + '_' + column_name + '_fts'
+
+    def create_index(self, model, column_name):
+        index = self.index_name(model, column_name)
+        if index in self.indexed:
+            return
+
+        statements = [
+            'CREATE VIRTUAL TABLE "{index}" USING fts5({column}, content="{table}", content_rowid="id", tokenize="trigram")',
+            'CREATE TRIGGER IF NOT EXISTS "{index}_ai" AFTER INSERT ON "{table}" BEGIN '
+            'INSERT INTO "{index}"(rowid, {column}) VALUES (new.id, new.{column}); END',
+            'CREATE TRIGGER IF NOT EXISTS "{index}_ad" AFTER DELETE ON "{table}" BEGIN '
+            'INSERT INTO "{index}"("{index}", rowid, {column}) VALUES (\'delete\', old.id, old.{column}); END',
+            'CREATE TRIGGER IF NOT EXISTS "{index}_au" AFTER UPDATE OF {column} ON "{table}" BEGIN '
+            'INSERT INTO "{index}"("{index}", rowid, {column}) VALUES (\'delete\', old.id, old.{column}); '
+            'INSERT INTO "{index}"(rowid, {column}) VALUES (new.id, new.{column}); END',
+            # fill the new index with the rows that are already in the table
+            'INSERT INTO "{index}"("{index}") VALUES (\'rebuild\')'
+        ]
+        names = {'index': index, 'table': model.__tablename__, 'column': column_name}
+
+        with self.engine.begin() as connection:
+            exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index,)).first()
+            if exists is None:
+                for statement in statements:
+                    connection.execute(statement.format(**names))
+
+        self.indexed.add(index)
+
+    def search(self, query, model, column_name, term):
+        # the trigram tokenizer can only match terms of at least three characters
+        if len(term) < 3:
+            return super().search(query, model, column_name, term)
+
+        self.create_index(model, column_name)
+        index = self.index_name(model, column_name)
+        fts = table(index, column('rowid'), column('rank'), column(index))
+        matches = select([fts.c.rowid, fts.c.rank]) \
+            .where(fts.c[index].op('MATCH')('"' + term.replace('"', '""') + '"')) \
+            .alias('matches')
+
+        return query.join(matches, matches.c.rowid == model.id), -matches.c.rank
+
+
+search_backends = {
+    'like': LikeSearch,
+    'trigram': TrigramSearch,
+    'fts5': Fts5Search
+}
+
+# backend used for each database dialect when SEARCH_BACKEND is not configured
+default_search_backends = {
+    'postgresql': 'trigram',
+    'sqlite': 'fts5'
+}
+
+backends = {}
+
+'''
+get_search_backend(engine, name)
+    returns the search backend called name (the default one of the database if None) for an engine,
+    creating it on first use
+    backends are kept per engine and name since the FTS5 backend remembers which indexes exist
+'''
+def get_search_backend(engine, name=None):
+    if name is None:
+        name = default_search_backends.get(engine.dialect.name, 'like')
+    backend = backends.get((engine, name))
+    if backend is None:
+        backend = search_backends[name](engine)
+        backends[(engine, name)] = backend
+    return backend
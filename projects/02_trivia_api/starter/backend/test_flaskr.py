@@ -5,10 +5,11 @@ import os
 import unittest
 import json
 import datetime
+import tempfile
 from flask_sqlalchemy import SQLAlchemy
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr import create_app, QUIZ_SESSION_TTL
+from models import setup_db, db, Question, Category, QuizSession
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -52,6 +53,17 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Not found')
 
+    # test for GET /questions
+    def test_get_questions_after_last_question_of_previous_page(self):
+        first_page = json.loads(self.client().get('/questions').data)
+        res = self.client().get('/questions?after='+str(first_page['questions'][-1]['id']))
+        data = json.loads(res.data)
+        second_page = json.loads(self.client().get('/questions?page=2').data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['questions'], second_page['questions'])
+        self.assertEqual(data['total_questions'], first_page['total_questions'])
+
     # test for GET /categories
     def test_succesful_get_categories(self):
         res = self.client().get('/categories')
@@ -60,6 +72,13 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    # test for GET /categories
+    def test_get_categories_not_modified(self):
+        etag = self.client().get('/categories').headers['ETag']
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
     # test for GET /categories
     def test_get_categories_with_wrong_method(self):
         res = self.client().post('/categories')
@@ -128,6 +147,37 @@ class TriviaTestCase(unittest.TestCase):
         inserted_question = Question.query.filter_by(question=new_question).first()
         self.assertEqual(data['question_id'], inserted_question.id)
 
+    # test for POST /questions/batch
+    def test_create_questions_in_batch_skips_invalid_questions(self):
+        new_question = 'Test Question'+str(datetime.datetime.now())
+        body = {
+            'questions': [
+                {'question': new_question, 'answer': 'Test Answer', 'difficulty': 4, 'category': 1},
+                {'question': new_question, 'answer': '', 'difficulty': 4, 'category': 1},
+                {'question': new_question, 'answer': 'Test Answer', 'difficulty': 4, 'category': 1000}
+            ]
+        }
+        res = self.client().post('/questions/batch', json=body)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual([error['row'] for error in data['errors']], [2, 3])
+        self.assertEqual(Question.query.filter_by(question=new_question).count(), 1)
+
+    # test for flask load-questions
+    def test_load_questions_from_json_object(self):
+        new_question = 'Test Question'+str(datetime.datetime.now())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pack.json')
+            with open(path, 'w', encoding='utf-8') as pack:
+                json.dump({'questions': [
+                    {'question': new_question, 'answer': 'Test Answer', 'difficulty': 4, 'category': 1}
+                ]}, pack)
+            result = self.app.test_cli_runner().invoke(args=['load-questions', path])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(Question.query.filter_by(question=new_question).count(), 1)
+
     # test for POST /questions
     def test_create_question_without_answer(self):
         new_question = 'Test Question'+str(datetime.datetime.now())
@@ -158,6 +208,18 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['totalQuestions'], 2)
         self.assertEqual(len(data['questions']), 2)
 
+    # test for POST /questions
+    def test_search_question_is_case_insensitive(self):
+        body = {
+            'searchTerm': 'WORLD CUP'
+        }
+        res = self.client().post('/questions', json=body)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['totalQuestions'], 2)
+        self.assertEqual(len(data['questions']), 2)
+
     # test for POST /questions
     def test_search_question_without_results(self):
         search_term = 'salesforce'
@@ -205,6 +267,60 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question'])
         self.assertEqual(data['question'], questions[0].format())
 
+    # test for POST /quizzes
+    def test_succesful_play_quiz_with_server_side_session(self):
+        category = Category.query.first()
+        input_category = {
+            'type': category.type,
+            'id': category.id
+        }
+        question_ids = [question.id for question in Question.query.filter_by(category=category.id)]
+        res = self.client().post('/quizzes', json={'start_session': True, 'quiz_category': input_category})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['quiz_id'])
+        self.assertIsNotNone(QuizSession.query.get(data['quiz_id']))
+
+        asked = [data['question']['id']]
+        for _ in question_ids[1:]:
+            data = json.loads(self.client().post('/quizzes', json={'quiz_id': data['quiz_id']}).data)
+            asked.append(data['question']['id'])
+        data = json.loads(self.client().post('/quizzes', json={'quiz_id': data['quiz_id']}).data)
+        self.assertEqual(sorted(asked), sorted(question_ids))
+        self.assertEqual(data['question'], None)
+
+    # test for POST /quizzes
+    def test_failed_return_quiz_question_expired_quiz(self):
+        res = self.client().post('/quizzes', json={'start_session': True})
+        quiz_id = json.loads(res.data)['quiz_id']
+        quiz = QuizSession.query.get(quiz_id)
+        quiz.updated_at = quiz.updated_at - datetime.timedelta(seconds=QUIZ_SESSION_TTL + 1)
+        db.session.commit()
+
+        res = self.client().post('/quizzes', json={'quiz_id': quiz_id})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    # test for POST /quizzes
+    def test_failed_return_quiz_question_without_previous_questions(self):
+        sessions = QuizSession.query.count()
+        res = self.client().post('/quizzes', json={'quiz_category': {'type': 'Science', 'id': 1}})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Could not process request')
+        self.assertEqual(QuizSession.query.count(), sessions)
+
+    # test for POST /quizzes
+    def test_failed_return_quiz_question_unknown_quiz(self):
+        res = self.client().post('/quizzes', json={'quiz_id': 'unknown'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'Not found')
+
     # test for POST /quizzes
     def test_failed_return_quiz_question_wrong_format_input_category(self):
         category = Category.query.first()
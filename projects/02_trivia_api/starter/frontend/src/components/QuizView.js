@@ -10,6 +10,7 @@ class QuizView extends Component {
     super();
     this.state = {
         quizCategory: null,
+        quizId: null,
         previousQuestions: [], 
         showAnswer: false,
         categories: {},
@@ -52,8 +53,11 @@ class QuizView extends Component {
       type: "POST",
       dataType: 'json',
       contentType: 'application/json',
-      data: JSON.stringify({
-        previous_questions: previousQuestions,
+      // the server remembers the questions already asked in the quiz
+      data: JSON.stringify(this.state.quizId ? {
+        quiz_id: this.state.quizId
+      } : {
+        start_session: true,
         quiz_category: this.state.quizCategory
       }),
       xhrFields: {
@@ -63,6 +67,7 @@ class QuizView extends Component {
       success: (result) => {
         this.setState({
           showAnswer: false,
+          quizId: result.quiz_id,
           previousQuestions: previousQuestions,
           currentQuestion: result.question,
           guess: '',
@@ -90,6 +95,7 @@ class QuizView extends Component {
   restartGame = () => {
     this.setState({
       quizCategory: null,
+      quizId: null,
       previousQuestions: [], 
       showAnswer: false,
       numCorrect: 0,
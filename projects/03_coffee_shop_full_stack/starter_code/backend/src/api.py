@@ -1,166 +1,264 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, abort
 from sqlalchemy import exc
 import json
+import click
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, db_upgrade_schema, setup_db, db, Drink
 from .auth.auth import AuthError, requires_auth
-
-app = Flask(__name__)
-setup_db(app)
-CORS(app)
+from .json_provider import jsonify, get_json_provider
+from .menu import menu_cache
+from .events import menu_events, TooManySubscribers
 
 '''
-uncomment the following line to initialize the datbase
-!! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
-!! NOTE THIS MUST BE UNCOMMENTED ON FIRST RUN
+create_app(config)
+    creates and configures the app
+    config is an optional dictionary of settings overriding the defaults, e.g.
+        SQLALCHEMY_DATABASE_URI: the database, the SQLite file of database/models.py by default
+        SQLALCHEMY_ENGINE_OPTIONS: the connection pool settings (see default_engine_options in database/models.py)
+    the database tables are not created here, run flask init-db once instead
 '''
-db_drop_and_create_all()
+def create_app(config=None):
+    app = Flask(__name__)
+    if config is not None:
+        app.config.update(config)
+    setup_db(app)
+    CORS(app)
 
-## ROUTES
-'''
-    GET /drinks
-        it is a public endpoint
-        it contains only the drink.short() data representation
-    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
-'''
-@app.route('/drinks')
-def get_drinks():
-    drinks = Drink.query.all()
-    formatted_drinks = [drink.short() for drink in drinks]
+    '''
+    flask init-db
+        creates the database tables that do not exist yet
+        tables created before recipes were stored as ingredient rows are rebuilt, keeping the drinks
+        with --drop, drops all the tables first
+        !! NOTE --drop WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
+    '''
+    @app.cli.command('init-db')
+    @click.option('--drop', is_flag=True, help='Drop all the tables and their records first.')
+    def init_db_command(drop):
+        """Create the database tables."""
+        if drop:
+            db_drop_and_create_all()
+        else:
+            for title in db_upgrade_schema():
+                click.echo('dropped the drink {!r}, its recipe could not be read'.format(title))
+            db.create_all()
+        click.echo('initialized the database')
 
-    return jsonify({
-        'success': True,
-        'drinks': formatted_drinks
-        })
+    '''
+    method to respond with the menu, in short form or in long form if detail is True
+    the serialized menu is cached between changes of the drinks (see menu.py),
+    the response carries its ETag and last modification time and clients have to revalidate it,
+    requests with a matching If-None-Match or If-Modified-Since get an empty 304 response
+    '''
+    def menu_response(detail=False):
+        def build():
+            provider = get_json_provider(app.config.get('JSON_PROVIDER'))
+            return provider.dumps({
+                'success': True,
+                'drinks': Drink.menu(detail=detail)
+                })
 
+        body, etag, last_modified = menu_cache.get('drinks-detail' if detail else 'drinks', build)
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = ('private' if detail else 'public') + ', no-cache'
+        return response.make_conditional(request)
 
-'''
-    GET /drinks-detail
-        it requires the 'get:drinks-detail' permission
-        it contains the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
-'''
-@app.route('/drinks-detail')
-@requires_auth('get:drinks-detail')
-def get_drinks_detail(jwt):
-    drinks = Drink.query.all()
-    formatted_drinks = [drink.long() for drink in drinks]
+    '''
+    method to record a change of the menu after it is committed
+    it drops the cached menu and sends the event to the clients listening to GET /drinks/events
+    '''
+    def menu_changed(event_type, data):
+        menu_cache.changed()
+        provider = get_json_provider(app.config.get('JSON_PROVIDER'))
+        menu_events.publish(event_type, provider.dumps(data).decode('utf-8'))
 
-    return jsonify({
-        'success': True,
-        'drinks': formatted_drinks
-        })
+    ## ROUTES
+    '''
+        GET /drinks
+            it is a public endpoint
+            it contains only the drink.short() data representation
+        returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks,
+        or status code 304 if the menu did not change since the client last got it
+    '''
+    @app.route('/drinks')
+    def get_drinks():
+        return menu_response()
 
-'''
-    POST /drinks
-        it creates a new row in the drinks table
-        it requires the 'post:drinks' permission
-        it contains the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the newly created drink
-'''
-@app.route('/drinks', methods=['POST'])
-@requires_auth('post:drinks')
-def post_drink(jwt):
-    body = request.get_json()
-    title = body.get('title', None)
-    recipe = str(json.dumps(body.get('recipe', None)))
-    
-    new_drink = Drink(title=title, recipe=recipe)
-    new_drink.insert()
-    drinks = []
-    drinks.append(new_drink.long())
-
-    return jsonify({
-        'success': True,
-        'drinks': drinks
-        })
 
-'''
-    PATCH /drinks/<id>
-        where <id> is the existing model id
-        it responds with a 404 error if <id> is not found
-        it updates the corresponding row for <id>
-        it requires the 'patch:drinks' permission
-        it contains the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drink} where drink is an array containing only the updated drink
-'''
-@app.route('/drinks/<int:drink_id>', methods=['PATCH'])
-@requires_auth('patch:drinks')
-def patch_drink(jwt, drink_id):
-
-    drink = Drink.query.get(drink_id)
+    '''
+        GET /drinks-detail
+            it requires the 'get:drinks-detail' permission
+            it contains the drink.long() data representation
+        returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks,
+        or status code 304 if the menu did not change since the client last got it
+    '''
+    @app.route('/drinks-detail')
+    @requires_auth('get:drinks-detail')
+    def get_drinks_detail(jwt):
+        return menu_response(detail=True)
 
-    if drink is None:
-        abort(404)
-    else:
+    '''
+        POST /drinks
+            it creates a new row in the drinks table
+            it requires the 'post:drinks' permission
+            it contains the drink.long() data representation
+            it responds with a 422 error if the recipe is not a list of ingredients or the title is taken
+        returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the newly created drink
+    '''
+    @app.route('/drinks', methods=['POST'])
+    @requires_auth('post:drinks')
+    def post_drink(jwt):
         body = request.get_json()
         title = body.get('title', None)
-        recipe = json.loads(json.dumps(body.get('recipe', None)))
 
-        if title is not None and title != '':
-            drink.title = title
-        if recipe is not None and recipe != '':
-            drink.recipe = str(recipe)
-        drink.update()
+        try:
+            new_drink = Drink(title=title, recipe=body.get('recipe', None))
+            new_drink.insert()
+            menu_changed('drink-created', new_drink.short())
+        except (ValueError, exc.IntegrityError):
+            db.session.rollback()
+            abort(422)
         drinks = []
-        drinks.append(drink.long())
+        drinks.append(new_drink.long())
 
         return jsonify({
             'success': True,
             'drinks': drinks
             })
 
+    '''
+        PATCH /drinks/<id>
+            where <id> is the existing model id
+            it responds with a 404 error if <id> is not found
+            it updates the corresponding row for <id>
+            it requires the 'patch:drinks' permission
+            it contains the drink.long() data representation
+            it responds with a 422 error if the recipe is not a list of ingredients or the title is taken
+        returns status code 200 and json {"success": True, "drinks": drink} where drink is an array containing only the updated drink
+    '''
+    @app.route('/drinks/<int:drink_id>', methods=['PATCH'])
+    @requires_auth('patch:drinks')
+    def patch_drink(jwt, drink_id):
 
-'''
-    DELETE /drinks/<id>
-        where <id> is the existing model id
-        it responds with a 404 error if <id> is not found
-        it deletes the corresponding row for <id>
-        it requires the 'delete:drinks' permission
-    returns status code 200 and json {"success": True, "delete": id} where id is the id of the deleted record
-'''
-@app.route('/drinks/<int:drink_id>', methods=['DELETE'])
-@requires_auth('delete:drinks')
-def delete_drink(jwt, drink_id):
-    drink = Drink.query.get(drink_id)
+        drink = Drink.query.get(drink_id)
 
-    if drink is None:
-        abort(404)
-    else:
-        drink.delete()
+        if drink is None:
+            abort(404)
+        else:
+            body = request.get_json()
+            title = body.get('title', None)
+            recipe = body.get('recipe', None)
 
-        return jsonify({
-            'success': True,
-            'delete': drink_id
+            try:
+                if title is not None and title != '':
+                    drink.title = title
+                if recipe is not None and recipe != '':
+                    drink.recipe = recipe
+                drink.update()
+                menu_changed('drink-updated', drink.short())
+            except (ValueError, exc.IntegrityError):
+                db.session.rollback()
+                abort(422)
+            drinks = []
+            drinks.append(drink.long())
+
+            return jsonify({
+                'success': True,
+                'drinks': drinks
+                })
+
+
+    '''
+        DELETE /drinks/<id>
+            where <id> is the existing model id
+            it responds with a 404 error if <id> is not found
+            it deletes the corresponding row for <id>
+            it requires the 'delete:drinks' permission
+        returns status code 200 and json {"success": True, "delete": id} where id is the id of the deleted record
+    '''
+    @app.route('/drinks/<int:drink_id>', methods=['DELETE'])
+    @requires_auth('delete:drinks')
+    def delete_drink(jwt, drink_id):
+        drink = Drink.query.get(drink_id)
+
+        if drink is None:
+            abort(404)
+        else:
+            drink.delete()
+            menu_changed('drink-deleted', {'id': drink_id})
+
+            return jsonify({
+                'success': True,
+                'delete': drink_id
+                })
+
+    '''
+        GET /drinks/events
+            it is a public endpoint
+            it streams the changes of the menu as server-sent events, each with an id,
+            a type and a JSON data line:
+                drink-created and drink-updated with the drink.short() data representation
+                drink-deleted with {"id": id}
+                reset with {} when the client missed events and has to reload GET /drinks
+            clients reconnecting with a Last-Event-ID header get the events they missed
+            only the changes made by the process serving the stream are sent
+            it responds with a 503 error when too many clients are already listening
+    '''
+    @app.route('/drinks/events')
+    def get_drink_events():
+        last_event_id = request.headers.get('Last-Event-ID', None, type=int)
+        try:
+            subscription = menu_events.subscribe(last_event_id)
+        except TooManySubscribers:
+            abort(503)
+
+        response = Response(menu_events.stream(subscription), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
             })
+        # the stream unsubscribes when it ends, but it never starts for HEAD requests
+        # or clients that go away before the first event, closing the response covers them
+        response.call_on_close(lambda: menu_events.unsubscribe(subscription))
+        return response
+
+    ## Error Handling
 
-## Error Handling
+    @app.errorhandler(422)
+    def unprocessable(error):
+        return jsonify({
+                        "success": False, 
+                        "error": 422,
+                        "message": "unprocessable"
+                        }), 422
 
-@app.errorhandler(422)
-def unprocessable(error):
-    return jsonify({
-                    "success": False, 
-                    "error": 422,
-                    "message": "unprocessable"
-                    }), 422
+    @app.errorhandler(404)
+    def unprocessable(error):
+        return jsonify({
+                        "success": False, 
+                        "error": 404,
+                        "message": "not found"
+                        }), 404
 
-@app.errorhandler(404)
-def unprocessable(error):
-    return jsonify({
-                    "success": False, 
-                    "error": 404,
-                    "message": "not found"
-                    }), 404
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        return jsonify({
+                        "success": False, 
+                        "error": 503,
+                        "message": "service unavailable"
+                        }), 503
 
-'''
-error handler for AuthError
-'''
-@app.errorhandler(AuthError)
-def handle_auth_error(error):
-    return jsonify({
-        "success": False,
-        "error": error.status_code,
-        "message": error.error.code
-        }), error.status_code
+    '''
+    error handler for AuthError
+    '''
+    @app.errorhandler(AuthError)
+    def handle_auth_error(error):
+        return jsonify({
+            "success": False,
+            "error": error.status_code,
+            "message": error.error.code
+            }), error.status_code
+
+    return app
@@ -0,0 +1,132 @@
+'''
+asynchronous variant of auth.py, for Flask async views or ASGI applications
+the event loop is never blocked: the keys of the identity provider are fetched and the
+token signatures are verified in thread pools, and a request waiting for a slow identity provider
+gives up after JWKS_WAIT_TIMEOUT seconds with a 503 error
+it shares jwks_cache and token_cache with auth.py, so tokens verified by either path are only verified once
+EXAMPLE
+    @app.route('/drinks-detail')
+    @requires_auth('get:drinks-detail')
+    async def get_drinks_detail(jwt):
+        ...
+'''
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from flask import request, abort, g
+
+from . import auth
+from .auth import (AuthError, parse_auth_header, get_token_kid, decode_jwt, jwks_unavailable,
+                   permission_set, required_permission_set, check_permissions)
+from .jwks import JWKS_FETCH_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# number of threads verifying token signatures, which is CPU-bound work
+VERIFY_WORKERS = 4
+# number of threads fetching the keys of the identity provider, only busy when the keys are refreshed
+JWKS_FETCH_WORKERS = 2
+# number of seconds a request waits for the keys of the identity provider, including the time spent
+# waiting for a refresh started by another request
+JWKS_WAIT_TIMEOUT = JWKS_FETCH_TIMEOUT + 1
+
+verify_executor = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix='jwt-verify')
+jwks_executor = ThreadPoolExecutor(max_workers=JWKS_FETCH_WORKERS, thread_name_prefix='jwks-fetch')
+
+'''
+method to get the RSA key with the given key id from auth.jwks_cache without blocking the event loop
+keys that are cached and not expired are returned right away, otherwise the cache is refreshed
+in jwks_executor, so that concurrent requests share the same fetch (see jwks.py)
+it raises an AuthError if the keys cannot be fetched in time
+'''
+async def get_key(kid):
+    jwks_cache = auth.jwks_cache
+    expires_at = jwks_cache.expires_at
+    if expires_at is not None and time.monotonic() < expires_at and kid in jwks_cache.keys:
+        # does not block, a refresh ahead of expiration runs in a background thread
+        return jwks_cache.get_key(kid)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(jwks_executor, jwks_cache.get_key, kid),
+                                      JWKS_WAIT_TIMEOUT)
+    except Exception:
+        raise jwks_unavailable()
+
+'''
+method to verify and decode jwt, like auth.verify_token
+the signature is verified in verify_executor
+return the decoded payload and its permissions as returned by permission_set
+'''
+async def verify_token(token):
+    # THE SAME TOKEN IS SENT WITH MANY REQUESTS, ONLY VERIFY IT ONCE
+    entry = auth.token_cache.get_entry(token)
+    if entry is not None:
+        return entry
+
+    rsa_key = await get_key(get_token_kid(token))
+
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(verify_executor, partial(decode_jwt, token, rsa_key))
+    permissions = permission_set(payload)
+    auth.token_cache.set(token, payload, permissions)
+
+    return payload, permissions
+
+async def verify_decode_jwt(token):
+    return (await verify_token(token))[0]
+
+'''
+method to authenticate and authorize a request from the value of its Authorization header,
+for ASGI applications that do not use the flask request
+@INPUTS
+        auth_header: the value of the header, None if the header is not present
+        permission: string permission (i.e. 'post:drink') or list of string permissions
+        require: 'all' if every permission is required, 'any' if one of them is enough
+it raises an AuthError if the request is not allowed
+return the decoded payload
+'''
+async def authenticate(auth_header, permission='', require='all'):
+    token = parse_auth_header(auth_header)
+    payload, permissions = await verify_token(token)
+    check_permissions(permission, payload, permissions, require)
+    return payload
+
+'''
+Decorator method for async views, like auth.requires_auth
+    @INPUTS
+        permission: string permission (i.e. 'post:drink') or list of string permissions
+        require: 'all' if every permission is required, 'any' if one of them is enough
+the time spent in each stage is kept in g.auth_timings, in milliseconds, and logged at the debug level
+return the decorator which passes the decoded payload to the decorated coroutine
+'''
+def requires_auth(permission='', require='all'):
+    if require not in ('all', 'any'):
+        raise ValueError("require must be 'all' or 'any'")
+    required = required_permission_set(permission)
+
+    def requires_auth_decorator(f):
+        @wraps(f)
+        async def wrapper(*args, **kwargs):
+            timings = g.auth_timings = {}
+            try:
+                start = time.perf_counter()
+                token = parse_auth_header(request.headers.get('Authorization', None))
+                parsed = time.perf_counter()
+                timings['header'] = (parsed - start) * 1000
+                payload, permissions = await verify_token(token)
+                verified = time.perf_counter()
+                timings['verify'] = (verified - parsed) * 1000
+                check_permissions(required, payload, permissions, require)
+                timings['permissions'] = (time.perf_counter() - verified) * 1000
+            except AuthError as e:
+                logger.info('authentication failed for %s: %s', request.path, e.error)
+                abort(e.status_code)
+            finally:
+                logger.debug('auth timings (ms) for %s: %s', request.path, timings)
+            return await f(payload, *args, **kwargs)
+
+        return wrapper
+    return requires_auth_decorator
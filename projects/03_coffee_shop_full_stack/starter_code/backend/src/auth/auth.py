@@ -1,14 +1,25 @@
 import json
-from flask import request, _request_ctx_stack, abort
+import logging
+import time
+from flask import request, _request_ctx_stack, abort, g
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 
+from .jwks import JwksCache, fetch_jwks
+from .token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
 
 AUTH0_DOMAIN = 'coffee-shop-raluca.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee'
 
+# signing keys of the identity provider, fetched from its /.well-known/jwks.json (see jwks.py)
+# replace it with a JwksCache using another fetcher to verify tokens against a local stub server
+jwks_cache = JwksCache(lambda: fetch_jwks(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'))
+# payloads of the tokens verified recently, see token_cache.stats() for its hit rate
+token_cache = TokenCache()
+
 ## AuthError Exception
 '''
 AuthError Exception
@@ -32,14 +43,20 @@ return the token part of the header
 code based on Udacity class lecture on Authentication and Authorization
 '''
 def get_token_auth_header():
-    
-    if 'Authorization' not in request.headers:
+    return parse_auth_header(request.headers.get('Authorization', None))
+
+'''
+method to get the auth token from the value of an Authorization header, like get_token_auth_header
+@INPUTS
+        auth_header: the value of the header, None if the header is not present
+'''
+def parse_auth_header(auth_header):
+    if auth_header is None:
         raise AuthError({
                 'code': 'invalid_header',
                 'description': 'No Authorization in header.'
             }, 401)
 
-    auth_header = request.headers['Authorization']
     header_parts = auth_header.split(' ')
 
     if len(header_parts) != 2:
@@ -56,22 +73,51 @@ def get_token_auth_header():
     return header_parts[1]
 
 '''
-method to check if user has a given permission
+method to convert the permissions of a decoded jwt payload to a frozenset
+return None if permissions are not included in the payload
+'''
+def permission_set(payload):
+    if 'permissions' not in payload:
+        return None
+    return frozenset(payload['permissions'])
+
+'''
+method to convert the permissions required by a route to a frozenset
 @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: string permission (i.e. 'post:drink') or list of string permissions
+'''
+def required_permission_set(permission):
+    if isinstance(permission, str):
+        return frozenset([permission])
+    return frozenset(permission)
+
+'''
+method to check if user has the given permissions
+@INPUTS
+        permission: string permission (i.e. 'post:drink') or list of string permissions
         payload: decoded jwt payload
+        permissions: the payload permissions as returned by permission_set, computed from payload if not given
+        require: 'all' if every permission is required, 'any' if one of them is enough
 it raises an AuthError if permissions are not included in the payload
-it raises an AuthError if the requested permission string is not in the payload permissions array
+it raises an AuthError if the requested permissions are not in the payload permissions array
 return true otherwise
 code based on Udacity class lecture on Authentication and Authorization
 '''
-def check_permissions(permission, payload):
-    if 'permissions' not in payload:
+def check_permissions(permission, payload, permissions=None, require='all'):
+    if permissions is None:
+        permissions = permission_set(payload)
+    if permissions is None:
         raise AuthError({
                 'code': 'bad_request',
                 'description': 'No permissions in payload.'
             }, 400)
-    if permission not in payload['permissions']:
+
+    required = permission if isinstance(permission, frozenset) else required_permission_set(permission)
+    if require == 'any':
+        allowed = not required.isdisjoint(permissions)
+    else:
+        allowed = required <= permissions
+    if not allowed:
         raise AuthError({
                 'code': 'forbidden',
                 'description': 'User does not have required permission.'
@@ -84,43 +130,84 @@ method to verify and decode jwt
 @INPUTS
         token: a json web token (string)
         it should be an Auth0 token with key id (kid)
-method verifies the token using Auth0 /.well-known/jwks.json
+method verifies the token using the Auth0 /.well-known/jwks.json keys kept in jwks_cache
+tokens verified before and not expired yet are not verified again (see token_cache.py)
 it decodes the payload from the token
 it validates the claims
 return the decoded payload
 code based on Udacity class lecture on Authentication and Authorization
 '''
 def verify_decode_jwt(token):
-    # GET THE PUBLIC KEY FROM AUTH0
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    return verify_token(token)[0]
+
+'''
+method to verify and decode jwt, like verify_decode_jwt
+return the decoded payload and its permissions as returned by permission_set,
+which are only converted once per token and cached with the payload
+'''
+def verify_token(token):
+    # THE SAME TOKEN IS SENT WITH MANY REQUESTS, ONLY VERIFY IT ONCE
+    entry = token_cache.get_entry(token)
+    if entry is not None:
+        return entry
 
+    kid = get_token_kid(token)
+
+    # CHOOSE OUR KEY, FROM THE PUBLIC KEYS OF AUTH0 CACHED BY KEY ID
+    try:
+        rsa_key = jwks_cache.get_key(kid)
+    except Exception:
+        raise jwks_unavailable()
+
+    payload = decode_jwt(token, rsa_key)
+    permissions = permission_set(payload)
+    token_cache.set(token, payload, permissions)
+
+    return payload, permissions
+
+'''
+method to get the key id (kid) from the header of a jwt, before it is verified
+it raises an AuthError if the header cannot be parsed or has no key id
+'''
+def get_token_kid(token):
     # GET THE DATA IN THE TOKEN HEADER
-    unverified_header = jwt.get_unverified_header(token)
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except jwt.JWTError:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 401)
 
-    # CHOOSE OUR KEY
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
+    return unverified_header['kid']
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
-    
-    # verify token
+'''
+return the AuthError raised when the keys of the identity provider cannot be fetched
+'''
+def jwks_unavailable():
+    return AuthError({
+        'code': 'jwks_unavailable',
+        'description': 'Unable to fetch the keys of the identity provider.'
+    }, 503)
+
+'''
+method to verify the signature and the claims of a jwt with the key of the identity provider
+@INPUTS
+        token: a json web token (string)
+        rsa_key: the key returned by jwks_cache.get_key for the token key id, None if it is unknown
+it raises an AuthError if the token cannot be verified
+return the decoded payload
+'''
+def decode_jwt(token, rsa_key):
     if rsa_key:
         try:
             # USE THE KEY TO VALIDATE THE JWT
-            payload = jwt.decode(
+            return jwt.decode(
                 token,
                 rsa_key,
                 algorithms=ALGORITHMS,
@@ -128,8 +215,6 @@ def verify_decode_jwt(token):
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
 
-            return payload
-
         except jwt.ExpiredSignatureError:
             raise AuthError({
                 'code': 'token_expired',
@@ -154,24 +239,42 @@ def verify_decode_jwt(token):
 '''
 Decorator method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: string permission (i.e. 'post:drink') or list of string permissions
+        require: 'all' if every permission is required, 'any' if one of them is enough
 it uses the get_token_auth_header method to get the token
-it uses the verify_decode_jwt method to decode the jwt
-it uses the check_permissions method validate claims and check the requested permission
+it uses the verify_token method to decode the jwt
+it uses the check_permissions method validate claims and check the requested permissions
+the time spent in each of these stages is kept in g.auth_timings, in milliseconds,
+and logged at the debug level
 return the decorator which passes the decoded payload to the decorated method
+EXAMPLE
+    @requires_auth(['patch:drinks', 'delete:drinks'], require='any')
 '''
-def requires_auth(permission=''):
+def requires_auth(permission='', require='all'):
+    if require not in ('all', 'any'):
+        raise ValueError("require must be 'all' or 'any'")
+    required = required_permission_set(permission)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
+            timings = g.auth_timings = {}
             try:
+                start = time.perf_counter()
                 token = get_token_auth_header()
-                payload = verify_decode_jwt(token)
-                check_permissions(permission, payload)
-                return f(payload, *args, **kwargs)
+                parsed = time.perf_counter()
+                timings['header'] = (parsed - start) * 1000
+                payload, permissions = verify_token(token)
+                verified = time.perf_counter()
+                timings['verify'] = (verified - parsed) * 1000
+                check_permissions(required, payload, permissions, require)
+                timings['permissions'] = (time.perf_counter() - verified) * 1000
             except AuthError as e:
                 print(e.error)
                 abort(e.status_code)
+            finally:
+                logger.debug('auth timings (ms) for %s: %s', request.path, timings)
+            return f(payload, *args, **kwargs)
 
         return wrapper
     return requires_auth_decorator
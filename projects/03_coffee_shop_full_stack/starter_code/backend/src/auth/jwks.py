@@ -0,0 +1,117 @@
+import json
+import logging
+import threading
+import time
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+# number of seconds the fetched keys are used before they have to be fetched again
+JWKS_TTL = 3600
+# number of seconds before the keys expire during which they are refreshed in the background,
+# so that requests do not wait for the identity provider
+JWKS_REFRESH_AHEAD = 300
+# minimum number of seconds between two refreshes caused by tokens signed with an unknown key,
+# so that tokens with made-up key ids cannot make us hammer the identity provider
+JWKS_MIN_REFRESH_INTERVAL = 30
+# number of seconds to wait for the identity provider
+JWKS_FETCH_TIMEOUT = 5
+
+'''
+fetch_jwks(url)
+    default fetcher: downloads and parses the JSON Web Key Set published at url
+'''
+def fetch_jwks(url, timeout=JWKS_FETCH_TIMEOUT):
+    with urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+'''
+JwksCache
+    keeps the signing keys of the identity provider in memory, by key id (kid)
+    @INPUTS
+        fetcher: function without arguments returning the JSON Web Key Set as a dictionary,
+                 e.g. lambda: fetch_jwks('http://localhost:8000/.well-known/jwks.json') in tests
+    the keys are fetched on first use, refreshed in the background shortly before they expire,
+    and refreshed right away when they have expired or when a token is signed with an unknown key
+    whatever the reason, the keys are fetched at most once every JWKS_MIN_REFRESH_INTERVAL seconds
+    if a refresh fails, the keys fetched before are kept
+'''
+class JwksCache:
+    def __init__(self, fetcher, ttl=JWKS_TTL, refresh_ahead=JWKS_REFRESH_AHEAD,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refresh_interval = min_refresh_interval
+        self.keys = {}
+        self.expires_at = None
+        self.refreshed_at = None
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    '''
+    get_key(kid)
+        returns the RSA key with the given key id, or None if the identity provider does not have it
+        it raises the fetcher exception if the keys could never be fetched
+    '''
+    def get_key(self, kid):
+        now = time.monotonic()
+        if self.expires_at is None:
+            # the keys were never fetched, wait for them as another request may be fetching them
+            self.refresh(raise_errors=True)
+        elif self.refresh_allowed(now):
+            if now >= self.expires_at:
+                self.refresh()
+            elif now >= self.expires_at - self.refresh_ahead:
+                self.refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and self.refresh_allowed(time.monotonic()):
+            self.refresh()
+            key = self.keys.get(kid)
+        return key
+
+    def refresh_allowed(self, now):
+        return self.refreshed_at is None or now - self.refreshed_at >= self.min_refresh_interval
+
+    def refresh(self, raise_errors=False):
+        with self.lock:
+            # another request may have refreshed the keys while this one was waiting for the lock
+            if not self.refresh_allowed(time.monotonic()):
+                if raise_errors and self.expires_at is None:
+                    raise RuntimeError('The JSON Web Key Set could not be fetched')
+                return
+            self.refreshed_at = time.monotonic()
+            try:
+                jwks = self.fetcher()
+            except Exception:
+                if raise_errors:
+                    raise
+                logger.exception('Could not refresh the JSON Web Key Set, keeping the previous keys')
+                return
+
+            self.keys = {
+                key['kid']: {
+                    'kty': key['kty'],
+                    'kid': key['kid'],
+                    'use': key['use'],
+                    'n': key['n'],
+                    'e': key['e']
+                }
+                for key in jwks['keys'] if 'kid' in key
+            }
+            self.expires_at = self.refreshed_at + self.ttl
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# number of verified tokens remembered
+TOKEN_CACHE_MAX_ENTRIES = 1024
+
+'''
+TokenCache
+    bounded LRU of the payloads of verified tokens, so that a token sent with many requests
+    is only verified once
+    tokens are keyed by their SHA-256 hash, so the cache does not hold usable tokens,
+    and a payload is only returned until the expiration time (exp) of its token
+    tokens without exp, or that are not valid yet (nbf), are never cached
+    BasicFlaskAuth and the Coffee Shop each have an identical copy of this module
+    (BasicFlaskAuth/token_cache.py and
+    projects/03_coffee_shop_full_stack/starter_code/backend/src/auth/token_cache.py),
+    changes have to be made to both copies
+    the permissions of a token can be cached with its payload, e.g. as a frozenset,
+    so that they are only converted once per token
+    EXAMPLE
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, ...)
+            token_cache.set(token, payload)
+'''
+class TokenCache:
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, token):
+        if isinstance(token, str):
+            token = token.encode('utf-8')
+        return hashlib.sha256(token).hexdigest()
+
+    '''
+    get(token)
+        returns a copy of the payload of the token if it was verified and has not expired, None otherwise
+    '''
+    def get(self, token):
+        entry = self.get_entry(token)
+        return entry[0] if entry is not None else None
+
+    '''
+    get_entry(token)
+        returns a copy of the payload of the token and the permissions cached with it
+        if it was verified and has not expired, None otherwise
+    '''
+    def get_entry(self, token):
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1]), entry[2]
+
+    '''
+    set(token, payload, permissions)
+        remembers the payload of a token that has just been verified, and optionally its permissions
+        permissions are returned as is by get_entry, so they should be immutable
+    '''
+    def set(self, token, payload, permissions=None):
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)):
+            return
+        not_before = payload.get('nbf')
+        if not_before is not None and (not isinstance(not_before, (int, float)) or not_before > time.time()):
+            return
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (expires_at, dict(payload), permissions)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    '''
+    stats()
+        returns the number of hits and misses since the cache was created, the hit rate
+        and the number of cached tokens, e.g. to be logged periodically
+    '''
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries)
+            }
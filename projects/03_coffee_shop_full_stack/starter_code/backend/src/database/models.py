@@ -1,5 +1,7 @@
+import math
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, event, inspect, text
+from sqlalchemy.engine.url import make_url
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -7,28 +9,103 @@ database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
 
+# number of connections kept open per process, and number of extra connections opened under load
+POOL_SIZE = 5
+POOL_MAX_OVERFLOW = 10
+# number of seconds after which a connection is replaced, before the database server closes it
+POOL_RECYCLE = 1800
+# number of seconds a SQLite connection waits for the lock of another process before failing
+SQLITE_BUSY_TIMEOUT = 15
+
 db = SQLAlchemy()
 
+'''
+default_engine_options(database_uri)
+    returns the SQLALCHEMY_ENGINE_OPTIONS used when the app does not configure them
+    SQLite connections wait up to SQLITE_BUSY_TIMEOUT seconds for the database lock,
+    other databases get a pool of POOL_SIZE connections that are checked before use and recycled
+'''
+def default_engine_options(database_uri):
+    if make_url(database_uri).get_backend_name() == 'sqlite':
+        return {
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT}
+        }
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': POOL_MAX_OVERFLOW,
+        'pool_pre_ping': True,
+        'pool_recycle': POOL_RECYCLE
+    }
+
+'''
+set_sqlite_pragmas(dbapi_connection, connection_record)
+    switches new SQLite connections to write-ahead logging, so that readers do not block
+    the writer (and the other way round) when several workers share the database file
+'''
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout={}'.format(SQLITE_BUSY_TIMEOUT * 1000))
+    cursor.close()
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the database and the engine options can be set in the app config (SQLALCHEMY_DATABASE_URI
+    and SQLALCHEMY_ENGINE_OPTIONS), they default to the SQLite file database_path
+    and to default_engine_options
 '''
 def setup_db(app):
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", database_path)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                          default_engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
 
+    if make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == 'sqlite':
+        with app.app_context():
+            engine = db.get_engine()
+            if not event.contains(engine, 'connect', set_sqlite_pragmas):
+                event.listen(engine, 'connect', set_sqlite_pragmas)
+
 '''
 db_drop_and_create_all()
     drops the database tables and starts fresh
-    can be used to initialize a clean database
+    can be used to initialize a clean database, see flask init-db --drop
     !!NOTE you can change the database_filename variable to have multiple verisons of a database
 '''
 def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+db_upgrade_schema()
+    rebuilds the tables of a database created before recipes were stored as ingredient rows
+    (with a recipe column in the drink table), moving the recipe of every drink to its ingredients
+    it does nothing on databases that are up to date or empty
+    return the titles of the drinks whose recipe could not be read, which are not kept
+'''
+def db_upgrade_schema():
+    inspector = inspect(db.engine)
+    if 'drink' not in inspector.get_table_names():
+        return []
+    if 'recipe' not in [column['name'] for column in inspector.get_columns('drink')]:
+        return []
+
+    rows = db.session.execute(text('SELECT id, title, recipe FROM drink')).fetchall()
+    db.session.rollback()
+    db_drop_and_create_all()
+
+    skipped = []
+    for drink_id, title, recipe in rows:
+        try:
+            db.session.add(Drink(id=drink_id, title=title, recipe=json.loads(recipe)))
+        except (TypeError, ValueError):
+            skipped.append(title)
+    db.session.commit()
+    return skipped
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -38,21 +115,35 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
-    # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    # the ingredients of the recipe, in order
+    ingredients = db.relationship('Ingredient', order_by='Ingredient.position', lazy='selectin',
+                                  cascade='all, delete-orphan')
+
+    '''
+    recipe
+        the ingredients as the required datatype [{'color': string, 'name':string, 'parts':number}]
+        setting it replaces the ingredients of the drink
+        it raises a ValueError if the recipe does not have that datatype
+        EXAMPLE
+            drink = Drink(title=req_title, recipe=[{'color': 'blue', 'name': 'water', 'parts': 1}])
+    '''
+    @property
+    def recipe(self):
+        return [ingredient.long() for ingredient in self.ingredients]
+
+    @recipe.setter
+    def recipe(self, recipe):
+        self.ingredients = Ingredient.from_recipe(recipe)
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': [ingredient.short() for ingredient in self.ingredients]
         }
 
     '''
@@ -63,9 +154,35 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
+    '''
+    menu(detail)
+        short form (or long form if detail is True) representations of all the drinks, in id order,
+        built from a single query on drinks and ingredients without loading Drink objects
+    '''
+    @staticmethod
+    def menu(detail=False):
+        rows = db.session.query(Drink.id, Drink.title, Ingredient.name, Ingredient.color, Ingredient.parts) \
+            .outerjoin(Ingredient, Ingredient.drink_id == Drink.id) \
+            .order_by(Drink.id, Ingredient.position)
+
+        drinks = []
+        for drink_id, title, name, color, parts in rows:
+            if not drinks or drinks[-1]['id'] != drink_id:
+                drinks.append({
+                    'id': drink_id,
+                    'title': title,
+                    'recipe': []
+                })
+            if color is not None:
+                ingredient = {'color': color, 'parts': Ingredient.format_parts(parts)}
+                if detail:
+                    ingredient['name'] = name
+                drinks[-1]['recipe'].append(ingredient)
+        return drinks
+
     '''
     insert()
         inserts a new model into a database
@@ -104,4 +221,77 @@ class Drink(db.Model):
         db.session.commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+'''
+Ingredient
+an ingredient of the recipe of a drink, stored in its own row
+so that drinks can be listed without parsing their recipes
+'''
+class Ingredient(db.Model):
+    id = Column(Integer, primary_key=True)
+    drink_id = Column(Integer, ForeignKey('drink.id', ondelete='CASCADE'), nullable=False, index=True)
+    # rank of the ingredient in the recipe
+    position = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    color = Column(String, nullable=False)
+    parts = Column(Float, nullable=False)
+
+    '''
+    from_recipe(recipe)
+        builds the ingredients of a recipe given as [{'color': string, 'name':string, 'parts':number}]
+        (or as a single ingredient), parts may be sent as numeric strings by forms
+        and have to be a finite positive number
+        it raises a ValueError if the recipe does not have that datatype
+    '''
+    @staticmethod
+    def from_recipe(recipe):
+        if isinstance(recipe, dict):
+            recipe = [recipe]
+        if not isinstance(recipe, list) or len(recipe) == 0:
+            raise ValueError('recipe must be a non-empty list of ingredients')
+
+        ingredients = []
+        for position, item in enumerate(recipe):
+            if not isinstance(item, dict) or not item.get('name') or not item.get('color'):
+                raise ValueError('every ingredient must have a name and a color')
+            ingredients.append(Ingredient(
+                position=position,
+                name=str(item['name']),
+                color=str(item['color']),
+                parts=Ingredient.parse_parts(item.get('parts'))
+            ))
+        return ingredients
+
+    @staticmethod
+    def parse_parts(parts):
+        if isinstance(parts, bool):
+            raise ValueError('the parts of every ingredient must be a number')
+        try:
+            parts = float(parts)
+        except (TypeError, ValueError):
+            raise ValueError('the parts of every ingredient must be a number')
+        if not math.isfinite(parts) or parts <= 0:
+            raise ValueError('the parts of every ingredient must be a positive number')
+        return parts
+
+    '''
+    format_parts(parts)
+        whole numbers of parts are represented as integers, as they were sent
+    '''
+    @staticmethod
+    def format_parts(parts):
+        return int(parts) if parts.is_integer() else parts
+
+    def short(self):
+        return {
+            'color': self.color,
+            'parts': Ingredient.format_parts(self.parts)
+        }
+
+    def long(self):
+        return {
+            'color': self.color,
+            'name': self.name,
+            'parts': Ingredient.format_parts(self.parts)
+        }
\ No newline at end of file
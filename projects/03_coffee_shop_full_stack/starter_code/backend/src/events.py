@@ -0,0 +1,118 @@
+import queue
+import threading
+from collections import deque
+
+# maximum number of clients listening to the menu events at the same time in this process
+MAX_SUBSCRIBERS = 100
+# number of events waiting to be sent to a client before it is considered too slow
+SUBSCRIBER_QUEUE_SIZE = 50
+# number of recent events kept to be replayed to clients reconnecting with a Last-Event-ID
+HISTORY_SIZE = 100
+# number of seconds without event after which a comment is sent, to keep the connection open
+# and to notice clients that went away
+HEARTBEAT_INTERVAL = 15
+
+'''
+TooManySubscribers Exception
+raised when MAX_SUBSCRIBERS clients already listen to the events
+'''
+class TooManySubscribers(Exception):
+    pass
+
+'''
+Subscription
+    the bounded queue of the events waiting to be sent to one client
+    a client that lets its queue fill up is dropped: it gets a reset event and its stream ends,
+    so that a slow client can neither block the writers nor make the server buffer without limit
+'''
+class Subscription:
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+'''
+EventBroker
+    fans out the events published by the write handlers to the streams of all the subscribed clients
+    events are numbered, so that clients reconnecting with the id of the last event they received
+    get the events they missed, or a reset event if they are too old to be replayed
+    EXAMPLE
+        menu_events.publish('drink-created', json.dumps(drink.short()))
+'''
+class EventBroker:
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS, queue_size=SUBSCRIBER_QUEUE_SIZE,
+                 history_size=HISTORY_SIZE, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.subscribers = set()
+        self.history = deque(maxlen=history_size)
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    '''
+    publish(event_type, data)
+        sends an event to every subscribed client
+        data has to be serialized to a JSON string by the caller
+    '''
+    def publish(self, event_type, data):
+        with self.lock:
+            self.last_id += 1
+            event = (self.last_id, event_type, data)
+            self.history.append(event)
+            for subscription in self.subscribers:
+                subscription.put(event)
+
+    '''
+    subscribe(last_event_id)
+        registers a new client, queuing the events published after last_event_id if given
+        it raises TooManySubscribers if MAX_SUBSCRIBERS clients are already subscribed
+    '''
+    def subscribe(self, last_event_id=None):
+        subscription = Subscription(self.queue_size)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            if last_event_id is not None and last_event_id != self.last_id:
+                missed = [event for event in self.history if event[0] > last_event_id]
+                # events older than the history, or ids from before a restart of the server
+                if last_event_id > self.last_id or not missed or missed[0][0] != last_event_id + 1:
+                    subscription.put((self.last_id, 'reset', '{}'))
+                else:
+                    for event in missed:
+                        subscription.put(event)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    '''
+    stream(subscription)
+        yields the events of a subscription formatted as server-sent events, until the client
+        goes away or overflows its queue
+        the subscription is only dropped if the stream is iterated, callers have to unsubscribe
+        when the stream is closed before it starts
+    '''
+    def stream(self, subscription):
+        try:
+            while not subscription.overflowed:
+                try:
+                    event_id, event_type, data = subscription.queue.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(event_id, event_type, data)
+
+            # the client missed events, it has to reload the menu
+            yield 'id: {}\nevent: reset\ndata: {{}}\n\n'.format(self.last_id)
+        finally:
+            self.unsubscribe(subscription)
+
+menu_events = EventBroker()
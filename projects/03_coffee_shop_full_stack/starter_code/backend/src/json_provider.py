@@ -0,0 +1,69 @@
+import json
+
+from flask import current_app
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+'''
+JSON providers
+    a JSON provider serializes response bodies to compact UTF-8 JSON bytes
+    orjson is used when it is installed, the standard library encoder otherwise
+    set JSON_PROVIDER to 'orjson' or 'json' in the app config to choose one explicitly
+    the Trivia and Coffee Shop APIs each have an identical copy of this module
+    (projects/02_trivia_api/starter/backend/json_provider.py and
+    projects/03_coffee_shop_full_stack/starter_code/backend/src/json_provider.py),
+    changes have to be made to both copies
+'''
+
+'''
+StdlibJsonProvider
+    the standard library encoder, with the Flask encoder handling dates and the like
+    but without the pretty-printing and key sorting of flask.jsonify
+'''
+class StdlibJsonProvider:
+    name = 'json'
+
+    def dumps(self, data):
+        return json.dumps(data, cls=JSONEncoder, separators=(',', ':')).encode('utf-8')
+
+'''
+OrjsonProvider
+    orjson only accepts string keys by default, dictionaries keyed by ids are allowed explicitly
+'''
+class OrjsonProvider:
+    name = 'orjson'
+
+    def dumps(self, data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+json_providers = {
+    StdlibJsonProvider.name: StdlibJsonProvider(),
+    OrjsonProvider.name: OrjsonProvider()
+}
+
+'''
+get_json_provider(name)
+    returns the named provider, or the fastest one available if name is None
+'''
+def get_json_provider(name=None):
+    if name is None:
+        name = OrjsonProvider.name if orjson is not None else StdlibJsonProvider.name
+    if name == OrjsonProvider.name and orjson is None:
+        raise RuntimeError('JSON_PROVIDER is orjson but the orjson package is not installed')
+    return json_providers[name]
+
+'''
+jsonify(*args, **kwargs)
+    drop-in replacement for flask.jsonify using the JSON provider of the current app
+'''
+def jsonify(*args, **kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    data = args[0] if len(args) == 1 else (args or kwargs)
+
+    provider = get_json_provider(current_app.config.get('JSON_PROVIDER'))
+    return current_app.response_class(provider.dumps(data), mimetype=current_app.config['JSONIFY_MIMETYPE'])
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+import time
+
+# number of seconds a serialized menu is reused at most, so that changes made by
+# other processes serving the same database are picked up
+MENU_CACHE_TTL = 60
+
+'''
+MenuCache
+    the menu only changes when drinks are created, updated or deleted, so its serialized
+    JSON bodies are built once and reused until the next change
+    every change bumps the version of the menu and its last modification time
+    the ETag of a body is the hash of its content, so it is strong and the same in every process
+    a body rebuilt after its TTL with another content was changed by another process,
+    its last modification time is then the time it was rebuilt
+    EXAMPLE
+        body, etag, last_modified = menu_cache.get('drinks', build_body)
+        ...
+        drink.insert()
+        menu_cache.changed()
+'''
+class MenuCache:
+    def __init__(self, ttl=MENU_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self.last_modified = time.time()
+        self.bodies = {}
+        # ETag and last modification time of the last body built under each name
+        self.built = {}
+        self.lock = threading.Lock()
+
+    def changed(self):
+        with self.lock:
+            self.version += 1
+            self.last_modified = time.time()
+            self.bodies = {}
+
+    '''
+    get(name, build)
+        returns the body cached under name, its ETag and the last modification time of the menu
+        build is called without arguments to build the body (as bytes) when it is not cached
+    '''
+    def get(self, name, build):
+        cached = self.bodies.get(name)
+        if cached is not None and cached['version'] == self.version and cached['expires_at'] > time.monotonic():
+            return cached['body'], cached['etag'], cached['last_modified']
+
+        with self.lock:
+            version = self.version
+            last_modified = self.last_modified
+
+        body = build()
+        etag = hashlib.sha1(body).hexdigest()
+
+        with self.lock:
+            previous = self.built.get(name)
+            if previous is not None:
+                if previous[0] == etag:
+                    last_modified = max(last_modified, previous[1])
+                elif previous[1] >= last_modified:
+                    # the menu was changed by another process since the previous body was built
+                    last_modified = time.time()
+            self.built[name] = (etag, last_modified)
+            # a change while the body was built makes it stale, it is then returned but not kept
+            if version == self.version:
+                self.bodies[name] = {
+                    'version': version,
+                    'expires_at': time.monotonic() + self.ttl,
+                    'body': body,
+                    'etag': etag,
+                    'last_modified': last_modified
+                }
+        return body, etag, last_modified
+
+menu_cache = MenuCache()
@@ -0,0 +1,295 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.api import create_app
+from src.database.models import db, Drink, Ingredient
+from src.events import menu_events
+from src.menu import MenuCache
+from src.auth import async_auth
+from src.auth import auth
+from src.auth.auth import AuthError, requires_auth, permission_set, required_permission_set
+from src.auth.jwks import JwksCache
+from src.auth.token_cache import TokenCache
+
+
+# root of the repository, where the other projects keep their copies of the shared modules
+REPOSITORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..')
+
+
+def signing_key(kid):
+    return {'kid': kid, 'kty': 'RSA', 'use': 'sig', 'n': 'modulus-' + kid, 'e': 'AQAB'}
+
+
+class StubJwksFetcher:
+    """Returns the keys of kids, or raises error, and counts the calls."""
+
+    def __init__(self, *kids):
+        self.kids = list(kids)
+        self.error = None
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {'keys': [signing_key(kid) for kid in self.kids]}
+
+
+class CoffeeShopTestCase(unittest.TestCase):
+    """This class represents the coffee shop test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.database_path = os.environ.get(
+            'COFFEE_TEST_DATABASE_URL',
+            'sqlite:///{}'.format(os.path.join(self.database_dir.name, 'test.db')))
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path,
+            'TESTING': True
+        })
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+
+        self.heartbeat_interval = menu_events.heartbeat_interval
+        menu_events.heartbeat_interval = 0.01
+
+    def tearDown(self):
+        """Executed after reach test"""
+        auth.token_cache.clear()
+        menu_events.heartbeat_interval = self.heartbeat_interval
+        with self.app.app_context():
+            db.session.remove()
+            db.get_engine().dispose()
+        self.database_dir.cleanup()
+
+    # test for flask init-db
+    def test_init_db_upgrades_recipe_column(self):
+        with self.app.app_context():
+            db.drop_all()
+            db.session.execute('CREATE TABLE drink (id INTEGER NOT NULL, title VARCHAR(80), '
+                               'recipe VARCHAR(180) NOT NULL, PRIMARY KEY (id), UNIQUE (title))')
+            db.session.execute("INSERT INTO drink (id, title, recipe) VALUES "
+                               "(3, 'water', '[{\"name\": \"water\", \"color\": \"blue\", \"parts\": 1}]')")
+            db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['init-db'])
+        self.assertEqual(result.exit_code, 0)
+
+        with self.app.app_context():
+            drink = Drink.query.get(3)
+            self.assertEqual(drink.title, 'water')
+            self.assertEqual(drink.recipe, [{'color': 'blue', 'name': 'water', 'parts': 1}])
+
+            db.session.add(Drink(title='milk', recipe=[{'color': 'white', 'name': 'milk', 'parts': 1}]))
+            db.session.commit()
+            self.assertEqual(Drink.query.count(), 2)
+
+    def test_recipe_parts_must_be_finite_positive_numbers(self):
+        for parts in [float('inf'), float('nan'), 'nan', -1, 0, True, None, 'two']:
+            with self.assertRaises(ValueError):
+                Ingredient.from_recipe([{'name': 'water', 'color': 'blue', 'parts': parts}])
+
+        ingredients = Ingredient.from_recipe([{'name': 'water', 'color': 'blue', 'parts': '1.5'}])
+        self.assertEqual(ingredients[0].parts, 1.5)
+
+    def test_menu_rebuilt_with_other_content_is_modified(self):
+        menu_cache = MenuCache(ttl=0)
+        body, etag, last_modified = menu_cache.get('drinks', lambda: b'[]')
+        same_body, same_etag, same_last_modified = menu_cache.get('drinks', lambda: b'[]')
+        self.assertEqual((same_etag, same_last_modified), (etag, last_modified))
+
+        # another process changed the menu, this one only sees it once the cached body expires
+        new_body, new_etag, new_last_modified = menu_cache.get('drinks', lambda: b'[{"id": 1}]')
+        self.assertNotEqual(new_etag, etag)
+        self.assertGreater(new_last_modified, last_modified)
+
+    def test_token_cache_skips_tokens_not_valid_yet(self):
+        token_cache = TokenCache()
+        now = time.time()
+        token_cache.set('early', {'exp': now + 60, 'nbf': now + 30})
+        token_cache.set('valid', {'exp': now + 60, 'nbf': now - 30})
+
+        self.assertIsNone(token_cache.get('early'))
+        self.assertEqual(token_cache.get('valid'), {'exp': now + 60, 'nbf': now - 30})
+
+    def authorization(self, permissions):
+        """Returns the headers of a token verified before, with the given permissions."""
+        token = 'verified-token-' + '-'.join(permissions)
+        payload = {'exp': time.time() + 60, 'permissions': permissions}
+        auth.token_cache.set(token, payload, permission_set(payload))
+        return {'Authorization': 'Bearer ' + token}
+
+    def add_permission_routes(self):
+        @self.app.route('/test/any')
+        @requires_auth(['get:menu', 'get:drinks-detail'], require='any')
+        def get_with_any_permission(payload):
+            return 'ok'
+
+        @self.app.route('/test/all')
+        @requires_auth(('get:menu', 'get:drinks-detail'), require='all')
+        def get_with_all_permissions(payload):
+            return 'ok'
+
+    def test_requires_auth_any_permission(self):
+        self.add_permission_routes()
+        for permissions, status_code in [(['get:menu'], 200), (['get:drinks-detail'], 200),
+                                         (['get:menu', 'get:drinks-detail'], 200), (['post:drinks'], 403)]:
+            res = self.client().get('/test/any', headers=self.authorization(permissions))
+            self.assertEqual(res.status_code, status_code, permissions)
+
+    def test_requires_auth_all_permissions(self):
+        self.add_permission_routes()
+        for permissions, status_code in [(['get:menu'], 403), (['get:drinks-detail'], 403),
+                                         (['get:menu', 'get:drinks-detail', 'post:drinks'], 200)]:
+            res = self.client().get('/test/all', headers=self.authorization(permissions))
+            self.assertEqual(res.status_code, status_code, permissions)
+
+    # test for GET /drinks-detail
+    def test_requires_auth_single_permission(self):
+        res = self.client().get('/drinks-detail', headers=self.authorization(['post:drinks']))
+        self.assertEqual(res.status_code, 403)
+        res = self.client().get('/drinks-detail', headers=self.authorization(['get:drinks-detail']))
+        self.assertEqual(res.status_code, 200)
+
+    def test_required_permission_set_accepts_strings_lists_and_tuples(self):
+        self.assertEqual(required_permission_set('get:menu'), frozenset(['get:menu']))
+        self.assertEqual(required_permission_set(['get:menu', 'post:drinks']),
+                         required_permission_set(('get:menu', 'post:drinks')))
+        with self.assertRaises(ValueError):
+            requires_auth('get:menu', require='some')
+
+    # test for GET /drinks-detail
+    def test_cached_token_reuses_its_permission_set(self):
+        headers = self.authorization(['get:drinks-detail'])
+        with mock.patch.object(auth, 'permission_set', wraps=permission_set) as rebuilt:
+            for _ in range(3):
+                res = self.client().get('/drinks-detail', headers=headers)
+                self.assertEqual(res.status_code, 200)
+        rebuilt.assert_not_called()
+
+    # test for GET /drinks-detail
+    def test_malformed_token_is_unauthorized(self):
+        res = self.client().get('/drinks-detail', headers={'Authorization': 'Bearer abc.def.ghi'})
+        self.assertEqual(res.status_code, 401)
+
+    def test_malformed_token_is_unauthorized_async(self):
+        with self.assertRaises(AuthError) as context:
+            asyncio.run(async_auth.verify_token('abc.def.ghi'))
+        self.assertEqual(context.exception.status_code, 401)
+
+    def age_jwks_cache(self, jwks_cache, seconds):
+        jwks_cache.refreshed_at -= seconds
+        jwks_cache.expires_at -= seconds
+
+    def test_jwks_cache_refreshes_on_unknown_key(self):
+        fetcher = StubJwksFetcher('first')
+        jwks_cache = JwksCache(fetcher, ttl=3600, refresh_ahead=300, min_refresh_interval=30)
+        self.assertEqual(jwks_cache.get_key('first'), signing_key('first'))
+        self.assertEqual(fetcher.calls, 1)
+
+        # the identity provider rotated its keys
+        fetcher.kids = ['first', 'second']
+        self.age_jwks_cache(jwks_cache, 31)
+        self.assertEqual(jwks_cache.get_key('second'), signing_key('second'))
+        self.assertEqual(fetcher.calls, 2)
+
+    def test_jwks_cache_rate_limits_refreshes_on_unknown_keys(self):
+        fetcher = StubJwksFetcher('first')
+        jwks_cache = JwksCache(fetcher, ttl=3600, refresh_ahead=300, min_refresh_interval=30)
+        jwks_cache.get_key('first')
+
+        for _ in range(5):
+            self.assertIsNone(jwks_cache.get_key('made-up'))
+        self.assertEqual(fetcher.calls, 1)
+
+        self.age_jwks_cache(jwks_cache, 31)
+        self.assertIsNone(jwks_cache.get_key('made-up'))
+        self.assertEqual(fetcher.calls, 2)
+
+    def test_jwks_cache_refreshes_ahead_in_background(self):
+        fetcher = StubJwksFetcher('first')
+        jwks_cache = JwksCache(fetcher, ttl=3600, refresh_ahead=300, min_refresh_interval=30)
+        jwks_cache.get_key('first')
+
+        fetcher.kids = ['first', 'second']
+        self.age_jwks_cache(jwks_cache, 3600 - 100)
+        # the keys have not expired yet, so they are returned without waiting for the refresh
+        self.assertEqual(jwks_cache.get_key('first'), signing_key('first'))
+
+        deadline = time.monotonic() + 5
+        while jwks_cache.refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(fetcher.calls, 2)
+        self.assertEqual(sorted(jwks_cache.keys), ['first', 'second'])
+        self.assertGreater(jwks_cache.expires_at, time.monotonic() + 3600 - 100)
+
+    def test_jwks_cache_keeps_keys_when_refresh_fails(self):
+        fetcher = StubJwksFetcher('first')
+        jwks_cache = JwksCache(fetcher, ttl=3600, refresh_ahead=300, min_refresh_interval=30)
+        jwks_cache.get_key('first')
+
+        fetcher.error = OSError('identity provider unavailable')
+        self.age_jwks_cache(jwks_cache, 3601)
+        self.assertEqual(jwks_cache.get_key('first'), signing_key('first'))
+        self.assertEqual(fetcher.calls, 2)
+
+    def test_jwks_cache_raises_when_keys_were_never_fetched(self):
+        fetcher = StubJwksFetcher('first')
+        fetcher.error = OSError('identity provider unavailable')
+        jwks_cache = JwksCache(fetcher)
+        with self.assertRaises(OSError):
+            jwks_cache.get_key('first')
+
+    # test for HEAD /drinks/events
+    def test_head_drink_events_does_not_keep_subscribers(self):
+        for _ in range(3):
+            res = self.client().head('/drinks/events', buffered=True)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.mimetype, 'text/event-stream')
+
+        self.assertEqual(len(menu_events.subscribers), 0)
+
+    # test for GET /drinks/events
+    def test_aborted_drink_events_stream_unsubscribes(self):
+        res = self.client().get('/drinks/events', buffered=False)
+        self.assertEqual(len(menu_events.subscribers), 1)
+        self.assertEqual(next(iter(res.response)), b': keepalive\n\n')
+
+        res.close()
+        self.assertEqual(len(menu_events.subscribers), 0)
+
+    # test for GET /drinks/events
+    def test_drink_events_closed_before_first_event_unsubscribes(self):
+        res = self.client().get('/drinks/events', buffered=False)
+        self.assertEqual(len(menu_events.subscribers), 1)
+
+        res.close()
+        self.assertEqual(len(menu_events.subscribers), 0)
+
+    def assertSameCopy(self, path, copy_path):
+        copy_path = os.path.join(REPOSITORY_PATH, copy_path)
+        if not os.path.exists(copy_path):
+            self.skipTest('{} is not checked out'.format(copy_path))
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), path), 'rb') as module, \
+                open(copy_path, 'rb') as copy:
+            self.assertEqual(module.read(), copy.read(), '{} and {} have to stay identical'.format(path, copy_path))
+
+    def test_json_provider_copy_is_in_sync(self):
+        self.assertSameCopy(os.path.join('src', 'json_provider.py'),
+                            os.path.join('projects', '02_trivia_api', 'starter', 'backend', 'json_provider.py'))
+
+    def test_token_cache_copy_is_in_sync(self):
+        self.assertSameCopy(os.path.join('src', 'auth', 'token_cache.py'),
+                            os.path.join('BasicFlaskAuth', 'token_cache.py'))
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()